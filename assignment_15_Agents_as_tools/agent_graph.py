@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import copy
+import dataclasses
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Iterable, Mapping
+
+import yaml
+from openai.types.responses import FunctionToolParam
+
+from run_agent import Agent, _normalize_tools, as_tool, conclude
+from tools import ToolBox
+
+logger = logging.getLogger(__name__)
+
+# Tool names every agent may use without them being defined in YAML or passed in.
+BUILTIN_TOOLS = (conclude.__name__, 'web_search')
+# Compiled graphs kept in memory, most recently used last.
+MAX_COMPILED_GRAPHS = 32
+
+
+class GraphError(ValueError):
+    """Everything wrong with an agent graph, reported together when it is compiled."""
+
+    def __init__(self, source: str, problems: list[str]):
+        super().__init__(f'Invalid agent graph {source}:\n' + '\n'.join(f'  - {p}' for p in problems))
+        self.source = source
+        self.problems = problems
+
+
+@dataclass(frozen=True)
+class AgentGraph:
+    """
+    A YAML agent graph compiled once and reused across runs. Agents are read-only
+    and every tool reference is checked at compile time. Each run still gets its
+    own ToolBox (so run-scoped caches, semaphores and usage stay separate), but
+    tool schemas and each agent's tool list are generated once per graph.
+    """
+    name: str
+    agents: tuple[Agent, ...]
+    main: Agent
+    tool_functions: Mapping[str, Callable]
+    schemas: Mapping[str, FunctionToolParam] = field(default_factory=dict)
+    agent_tools: Mapping[str, tuple[FunctionToolParam, ...]] = field(default_factory=dict)
+    digest: str = ''
+
+    def build_toolbox(
+        self,
+        client,
+        usage: list[tuple[str, Any]] | None = None,
+        chained: bool = False,
+    ) -> ToolBox:
+        toolbox = ToolBox()
+        toolbox.tool(conclude, schema=self.schemas.get(conclude.__name__))
+        for fn in self.tool_functions.values():
+            toolbox.tool(fn, schema=self.schemas.get(fn.__name__))
+        for agent in self.agents:
+            if agent is not self.main:
+                fn = as_tool(client, toolbox, agent, usage=usage, chained=chained)
+                toolbox.tool(fn, schema=self.schemas.get(fn.__name__))
+        for agent in self.agents:
+            if (tools := self.agent_tools.get(agent['name'])) is not None:
+                toolbox.preload_tools(agent['tools'], tools)
+        return toolbox
+
+
+_compiled: OrderedDict[tuple, AgentGraph] = OrderedDict()
+
+
+def load_agent_graph(
+    yaml_path: str | Path,
+    tool_functions: Iterable[Callable] | dict[str, Callable] | None = None,
+    main_agent_name: str = 'main',
+    prompt_layout: str | None = None,
+) -> AgentGraph:
+    """
+    Compile the graph in yaml_path, or return the cached compilation while the
+    file's contents (by sha256) and the tool functions offered are unchanged.
+    Raises GraphError listing every problem found.
+    """
+    path = Path(yaml_path)
+    raw = path.read_bytes()
+    functions = _normalize_tools(tool_functions)
+    digest = hashlib.sha256(raw).hexdigest()
+    key = (digest, main_agent_name, prompt_layout, tuple(functions.items()))
+    if (graph := _compiled.get(key)) is not None:
+        _compiled.move_to_end(key)
+        return graph
+
+    graph = compile_agent_graph(raw.decode('utf-8'), path.stem, functions, main_agent_name, prompt_layout, str(path))
+    graph = dataclasses.replace(graph, digest=digest)
+    _compiled[key] = graph
+    if len(_compiled) > MAX_COMPILED_GRAPHS:
+        _compiled.popitem(last=False)
+    return graph
+
+
+def compile_agent_graph(
+    text: str,
+    name: str,
+    tool_functions: Iterable[Callable] | dict[str, Callable] | None = None,
+    main_agent_name: str = 'main',
+    prompt_layout: str | None = None,
+    source: str | None = None,
+) -> AgentGraph:
+    source = source or name
+    functions = _normalize_tools(tool_functions)
+    docs = [doc for doc in yaml.safe_load_all(text) if doc]
+    if not docs:
+        raise ValueError('YAML file has no agent definitions.')
+
+    problems: list[str] = []
+    agents: list[dict[str, Any]] = []
+    for i, doc in enumerate(docs, 1):
+        if not isinstance(doc, dict):
+            problems.append(f'document {i} is not a mapping')
+            continue
+        agent_name = doc.get('name')
+        if not isinstance(agent_name, str) or not agent_name:
+            problems.append(f'document {i} has no name')
+            continue
+        if any(a['name'] == agent_name for a in agents):
+            problems.append(f"agent '{agent_name}' is defined more than once")
+            continue
+        tools = doc.get('tools') or []
+        if not isinstance(tools, list) or not all(isinstance(t, str) for t in tools):
+            problems.append(f"agent '{agent_name}': tools must be a list of names")
+            tools = []
+        agent = copy.deepcopy(doc)
+        agent['tools'] = tuple(tools)
+        if prompt_layout:
+            agent.setdefault('prompt_layout', prompt_layout)
+        agents.append(agent)
+
+    names = [agent['name'] for agent in agents]
+    if main_agent_name not in names:
+        problems.append(f"no main agent named '{main_agent_name}'")
+    callable_agents = {n for n in names if n != main_agent_name}
+    for agent in agents:
+        for tool in agent['tools']:
+            if tool == main_agent_name:
+                problems.append(f"agent '{agent['name']}' uses the main agent '{tool}' as a tool")
+            elif tool not in callable_agents and tool not in functions and tool not in BUILTIN_TOOLS:
+                problems.append(f"agent '{agent['name']}' uses unknown tool '{tool}'")
+        for tool in agent.get('tool_timeouts') or {}:
+            if tool not in agent['tools']:
+                problems.append(f"agent '{agent['name']}' sets a timeout for '{tool}', which is not one of its tools")
+
+    edges = {agent['name']: [t for t in agent['tools'] if t in callable_agents] for agent in agents}
+    if cycle := _find_cycle(edges):
+        problems.append('agents call each other in a cycle: ' + ' -> '.join(cycle))
+    if problems:
+        raise GraphError(source, problems)
+
+    reachable = _reachable(edges, main_agent_name)
+    for unused in (n for n in names if n not in reachable):
+        logger.warning("Agent '%s' in %s is not reachable from '%s'", unused, source, main_agent_name)
+
+    frozen = tuple(MappingProxyType(agent) for agent in agents)
+    main = next(agent for agent in frozen if agent['name'] == main_agent_name)
+    graph = AgentGraph(name, frozen, main, MappingProxyType(dict(functions)))
+
+    template = graph.build_toolbox(client=None)
+    used = {tool for agent in agents for tool in agent['tools'] if tool != 'web_search'}
+    return dataclasses.replace(
+        graph,
+        schemas=MappingProxyType({tool: template.schema(tool) for tool in used}),
+        agent_tools=MappingProxyType({agent['name']: tuple(template.get_tools(agent['tools'])) for agent in agents}),
+    )
+
+
+def _find_cycle(edges: dict[str, list[str]]) -> list[str] | None:
+    """One cycle in the agent call graph as [a, b, ..., a], or None."""
+    visiting: list[str] = []
+    done: set[str] = set()
+
+    def visit(node: str) -> list[str] | None:
+        if node in visiting:
+            return visiting[visiting.index(node):] + [node]
+        if node in done:
+            return None
+        visiting.append(node)
+        for child in edges.get(node, []):
+            if cycle := visit(child):
+                return cycle
+        visiting.pop()
+        done.add(node)
+        return None
+
+    for start in edges:
+        if cycle := visit(start):
+            return cycle
+    return None
+
+
+def _reachable(edges: dict[str, list[str]], start: str) -> set[str]:
+    seen = {start}
+    stack = [start]
+    while stack:
+        for child in edges.get(stack.pop(), []):
+            if child not in seen:
+                seen.add(child)
+                stack.append(child)
+    return seen
@@ -0,0 +1,325 @@
+"""
+Long-lived asyncio HTTP service for YAML agent graphs. Graphs are loaded once at
+startup and every request shares one pooled keep-alive OpenAI client.
+
+    python agent_service.py software_team.yaml five_chats.yaml --port 8080
+
+    GET  /health
+    GET  /graphs                   loaded graphs and their agents
+    GET  /metrics                  per-agent usage, cost, latency and tool cache hits in Prometheus text format
+    POST /graphs/<name>/run        {"message": "...", "session": "optional id", "stream": false}
+
+A request with a session id continues that session's conversation (one turn at a
+time); without one it runs in a fresh session. With "stream": true the answer is
+sent as server-sent events: {"delta": ...} events, then a "done" event with usage.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any
+
+from agent_graph import AgentGraph, load_agent_graph
+from rate_limit import RateLimiter, load_limits
+from run_agent import (
+    _build_client,
+    _load_yaml_docs,
+    _metered_tool_cache,
+    _select_runtime_tools,
+    current_agent,
+    current_deadline,
+    current_run_path,
+    current_toolbox,
+    run_agent,
+    stream_agent,
+)
+from tools import ToolBox
+from usage import UsageMeter, current_meter, usage_summary
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1_000_000
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Session:
+    graph: AgentGraph
+    toolbox: ToolBox
+    history: list[Any] = field(default_factory=list)
+    usage: list[tuple[str, Any]] = field(default_factory=list)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _Request:
+    method: str
+    path: str
+    headers: dict[str, str]
+    body: bytes
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get('connection', '').lower() != 'close'
+
+
+async def _read_request(reader: asyncio.StreamReader) -> _Request | None:
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, 'Malformed request line')
+    headers: dict[str, str] = {}
+    while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+        key, _, value = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = value.strip()
+    length = int(headers.get('content-length') or 0)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Request body too large')
+    body = await reader.readexactly(length) if length else b''
+    return _Request(method.upper(), target.split('?', 1)[0], headers, body)
+
+
+def _head(status: HTTPStatus, headers: dict[str, str]) -> bytes:
+    lines = [f'HTTP/1.1 {status.value} {status.phrase}', *(f'{k}: {v}' for k, v in headers.items())]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def _send_json(writer: asyncio.StreamWriter, status: HTTPStatus, payload: Any, keep_alive: bool = True) -> None:
+    data = json.dumps(payload).encode('utf-8')
+    writer.write(_head(status, {
+        'Content-Type': 'application/json; charset=utf-8',
+        'Content-Length': str(len(data)),
+        'Connection': 'keep-alive' if keep_alive else 'close',
+    }) + data)
+    await writer.drain()
+
+
+def _event(data: Any, event: str | None = None) -> bytes:
+    prefix = f'event: {event}\n' if event else ''
+    return f'{prefix}data: {json.dumps(data)}\n\n'.encode('utf-8')
+
+
+class AgentService:
+    def __init__(self, graphs: dict[str, AgentGraph], client, chained: bool = False, session_ttl: float = 1800):
+        self.graphs = graphs
+        self.client = client
+        self.chained = chained
+        self.session_ttl = session_ttl
+        self.sessions: dict[tuple[str, str], Session] = {}
+        self.meter = UsageMeter()
+
+    def _session(self, graph: AgentGraph, session_id: str | None) -> Session:
+        self._expire_sessions()
+        key = (graph.name, session_id or uuid.uuid4().hex)
+        if (session := self.sessions.get(key)) is None:
+            usage: list[tuple[str, Any]] = []
+            toolbox = graph.build_toolbox(self.client, usage=usage, chained=self.chained)
+            session = Session(graph, toolbox, usage=usage)
+            if session_id:
+                self.sessions[key] = session
+        session.last_used = time.monotonic()
+        return session
+
+    def _expire_sessions(self) -> None:
+        cutoff = time.monotonic() - self.session_ttl
+        for key, session in list(self.sessions.items()):
+            if session.last_used < cutoff and not session.lock.locked():
+                del self.sessions[key]
+                session.toolbox.shutdown()
+
+    async def _run(self, session: Session, message: str, writer: asyncio.StreamWriter | None = None) -> str | None:
+        """One conversational turn; with a writer, deltas are streamed to it as they arrive."""
+        async with session.lock:
+            # Each connection is its own task, so these only affect this request.
+            scoped = (current_toolbox, current_agent, current_run_path, current_deadline, current_meter)
+            tokens = [var.set(value) for var, value in zip(scoped, (session.toolbox, None, None, None, self.meter))]
+            try:
+                with _metered_tool_cache(session.toolbox):
+                    if writer is None:
+                        return await run_agent(
+                            self.client,
+                            session.toolbox,
+                            session.graph.main,
+                            user_message=message,
+                            history=session.history,
+                            usage=session.usage,
+                            chained=self.chained,
+                        )
+                    chunks: list[str] = []
+                    async for delta in stream_agent(
+                        self.client,
+                        session.toolbox,
+                        session.graph.main,
+                        user_message=message,
+                        history=session.history,
+                        usage=session.usage,
+                        chained=self.chained,
+                    ):
+                        chunks.append(delta)
+                        writer.write(_event({'delta': delta}))
+                        await writer.drain()
+                    return ''.join(chunks) or None
+            finally:
+                for var, token in zip(scoped, tokens):
+                    var.reset(token)
+
+    async def _handle_run(self, request: _Request, writer: asyncio.StreamWriter, graph_name: str) -> bool:
+        graph = self.graphs.get(graph_name)
+        if graph is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f'Unknown graph: {graph_name}')
+        try:
+            payload = json.loads(request.body or b'{}')
+        except json.JSONDecodeError as exc:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f'Invalid JSON: {exc}')
+        message = payload.get('message') if isinstance(payload, dict) else None
+        if not isinstance(message, str):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be an object with a string 'message'")
+
+        session_id = payload.get('session')
+        session = self._session(graph, session_id)
+        usage_before = len(session.usage)
+        ephemeral = not session_id
+        try:
+            if not payload.get('stream'):
+                output = await self._run(session, message)
+                await _send_json(writer, HTTPStatus.OK, {
+                    'output': output,
+                    'session': session_id,
+                    'usage': usage_summary(session.usage[usage_before:]),
+                }, request.keep_alive)
+                return request.keep_alive
+
+            writer.write(_head(HTTPStatus.OK, {
+                'Content-Type': 'text/event-stream',
+                'Cache-Control': 'no-cache',
+                'Connection': 'close',
+            }))
+            try:
+                output = await self._run(session, message, writer)
+            except Exception as exc:
+                logger.exception('Streaming run failed')
+                writer.write(_event({'error': f'{type(exc).__name__}: {exc}'}, 'error'))
+            else:
+                writer.write(_event({
+                    'output': output,
+                    'session': session_id,
+                    'usage': usage_summary(session.usage[usage_before:]),
+                }, 'done'))
+            await writer.drain()
+            return False
+        finally:
+            if ephemeral:
+                session.toolbox.shutdown()
+
+    async def _dispatch(self, request: _Request, writer: asyncio.StreamWriter) -> bool:
+        parts = [part for part in request.path.split('/') if part]
+        if request.method == 'GET' and parts == ['health']:
+            await _send_json(writer, HTTPStatus.OK, {'status': 'ok', 'sessions': len(self.sessions)}, request.keep_alive)
+            return request.keep_alive
+        if request.method == 'GET' and parts == ['graphs']:
+            await _send_json(writer, HTTPStatus.OK, {
+                name: {'main': graph.main['name'], 'agents': [a['name'] for a in graph.agents]}
+                for name, graph in self.graphs.items()
+            }, request.keep_alive)
+            return request.keep_alive
+        if request.method == 'GET' and parts == ['metrics']:
+            data = self.meter.to_prometheus().encode('utf-8')
+            writer.write(_head(HTTPStatus.OK, {
+                'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+                'Content-Length': str(len(data)),
+                'Connection': 'keep-alive' if request.keep_alive else 'close',
+            }) + data)
+            await writer.drain()
+            return request.keep_alive
+        if request.method == 'POST' and len(parts) == 3 and parts[0] == 'graphs' and parts[2] == 'run':
+            return await self._handle_run(request, writer, parts[1])
+        raise HTTPError(HTTPStatus.NOT_FOUND, f'No route for {request.method} {request.path}')
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await _read_request(reader)
+                    if request is None:
+                        break
+                    keep_alive = await self._dispatch(request, writer)
+                except HTTPError as exc:
+                    await _send_json(writer, exc.status, {'error': str(exc)}, keep_alive=False)
+                    break
+                except Exception as exc:
+                    logger.exception('Request failed')
+                    await _send_json(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f'{type(exc).__name__}: {exc}'}, keep_alive=False)
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # client went away; any run it started has been cancelled with this task
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8080) -> None:
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        logger.info('Serving %s on http://%s:%d', ', '.join(self.graphs), host, port)
+        async with server:
+            await server.serve_forever()
+
+    def shutdown(self) -> None:
+        for session in self.sessions.values():
+            session.toolbox.shutdown()
+        self.sessions.clear()
+
+
+def load_graphs(yaml_paths: list[Path], prompt_layout: str | None = None) -> dict[str, AgentGraph]:
+    graphs = {}
+    for path in yaml_paths:
+        tools = _select_runtime_tools(_load_yaml_docs(path), interactive=False)
+        graph = load_agent_graph(path, tools, prompt_layout=prompt_layout)
+        graphs[graph.name] = graph
+    return graphs
+
+
+async def main(args) -> None:
+    limiter = RateLimiter(load_limits(args.rate_limits)) if args.rate_limits else None
+    client = _build_client(limiter=limiter, max_connections=args.max_connections)
+    service = AgentService(load_graphs(args.yaml_paths, args.prompt_layout), client, args.chain, args.session_ttl)
+    try:
+        await service.serve(args.host, args.port)
+    finally:
+        service.shutdown()
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description='Serve YAML agent graphs over HTTP.')
+    parser.add_argument('yaml_paths', type=Path, nargs='+', help='Agent YAML files; each is served under its file stem.')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind.')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on.')
+    parser.add_argument('--max-connections', type=int, default=100, help='Size of the shared keep-alive connection pool to the API.')
+    parser.add_argument('--rate-limits', type=Path, default=None, help='Schedule requests through per-model RPM/TPM buckets from this YAML mapping of model -> {rpm, tpm} (off by default).')
+    parser.add_argument('--chain', action='store_true', help='Chain requests with previous_response_id instead of resending history.')
+    parser.add_argument('--prompt-layout', choices=('prefix', 'suffix'), default=None, help='Prompt layout for agents that do not set one.')
+    parser.add_argument('--session-ttl', type=float, default=1800, help='Seconds an idle session is kept.')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    cli()
@@ -8,10 +8,10 @@ import subprocess
 import sys
 from pathlib import Path
 
-import yaml
 from openai import AsyncOpenAI
 
-from run_agent import run_agent, as_tool, Agent, conclude, current_agent
+from agent_graph import load_agent_graph
+from run_agent import run_agent, conclude, current_agent
 from tools import ToolBox
 from usage import print_usage
 
@@ -234,21 +234,12 @@ async def main(agent_config: Path, message: str):
     client = AsyncOpenAI()
     usages = []
 
-    def add_to_toolbox(_agent):
-        toolbox.tool(as_tool(client, toolbox, _agent, usage=usages))
-
-    agents: list[Agent] = list(yaml.safe_load_all(agent_config.read_text()))
-
-    for agent in agents:
-        if agent['name'] == 'main':
-            continue
-        add_to_toolbox(agent)
-
-    main_agent = next(agent for agent in agents if agent['name'] == 'main')
+    graph = load_agent_graph(agent_config, [talk_to_user, run_terminal, write_files, write_files_with_terminal])
+    team_toolbox = graph.build_toolbox(client, usage=usages)
 
     try:
         response = await run_agent(
-            client, toolbox, main_agent,
+            client, team_toolbox, graph.main,
             message, usage=usages
         )
 
@@ -273,7 +264,7 @@ def _configure_logging(debug: bool) -> None:
         datefmt='%H:%M:%S',
         force=True,
     )
-    for logger_name in ('__main__', 'agents', 'run_agent', 'tools', 'usage'):
+    for logger_name in ('__main__', 'agents', 'agent_graph', 'run_agent', 'tools', 'usage'):
         logging.getLogger(logger_name).setLevel(local_level)
 
 
@@ -0,0 +1,242 @@
+"""
+Run one YAML agent graph over a JSONL file of messages.
+
+    python run_agent.py batch software_team.yaml inputs.jsonl results.jsonl --workers 8 --processes 2
+
+Each input line is a JSON string or an object with "message" and an optional "id"
+(default: the line number). Each output line holds the id, the answer or error,
+per-item usage and elapsed seconds. Items already answered in the output file are
+skipped, so an interrupted batch resumes by running the same command again.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import queue
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+from rate_limit import RateLimiter, load_limits
+from response_cache import CACHE_MODES
+from run_agent import _build_client, _load_yaml_docs, _select_runtime_tools, bounded_map, run_pluggable_agent
+from usage import usage_summary
+
+
+def read_inputs(path: Path) -> list[tuple[str, str]]:
+    """(id, message) per line; raises ValueError if two lines share an id, since results are keyed by it."""
+    items = []
+    first_line: dict[str, int] = {}
+    duplicates: list[str] = []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, str):
+                item_id, message = str(line_number), entry
+            else:
+                item_id, message = str(entry.get('id', line_number)), entry['message']
+            if item_id in first_line:
+                duplicates.append(f'{item_id!r} (lines {first_line[item_id]} and {line_number})')
+            else:
+                first_line[item_id] = line_number
+            items.append((item_id, message))
+    if duplicates:
+        raise ValueError(f'Duplicate ids in {path}: ' + ', '.join(duplicates))
+    return items
+
+
+def completed_ids(path: Path) -> set[str]:
+    """Ids with a successful result in an existing output file."""
+    done: set[str] = set()
+    if not path.exists():
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # cut short by an interrupted run
+            if record.get('ok'):
+                done.add(record['id'])
+    return done
+
+
+def _scaled_limits(rate_limits: Path | None, processes: int) -> dict[str, dict[str, int]] | None:
+    """Each process gets its share of the account limits, since their limiters don't talk."""
+    if not rate_limits:
+        return None
+    limits = load_limits(rate_limits)
+    return {
+        model: {key: max(1, value // processes) for key, value in values.items()}
+        for model, values in limits.items()
+    }
+
+
+@dataclass
+class BatchOptions:
+    yaml_path: Path
+    workers: int = 4
+    timeout: float | None = None
+    limits: dict[str, dict[str, int]] | None = None
+    cache_mode: str = 'passthrough'
+    cache_dir: Path | None = None
+    prompt_layout: str | None = None
+
+
+async def run_shard(items: list[tuple[str, str]], options: BatchOptions, emit: Callable[[dict[str, Any]], None]) -> None:
+    """Run items on `options.workers` async workers sharing one client (and rate limiter, if limits were given)."""
+    limiter = RateLimiter(options.limits) if options.limits else None
+    client = _build_client(options.cache_mode, options.cache_dir, limiter)
+    tools = _select_runtime_tools(_load_yaml_docs(options.yaml_path), interactive=False)
+    messages = dict(items)
+    usages: dict[str, list] = {}
+    started: dict[str, float] = {}
+
+    async def run_item(item_id: str) -> str | None:
+        usages[item_id] = []
+        started[item_id] = time.perf_counter()
+        return await run_pluggable_agent(
+            yaml_path=options.yaml_path,
+            message=messages[item_id],
+            tool_functions=tools,
+            client=client,
+            usage=usages[item_id],
+            prompt_layout=options.prompt_layout,
+        )
+
+    async for result in bounded_map(run_item, messages, options.workers, options.timeout, ordered=False):
+        item_id = result.input
+        emit({
+            'id': item_id,
+            'ok': result.ok,
+            'output': result.output,
+            'error': result.error,
+            'seconds': round(time.perf_counter() - started.get(item_id, time.perf_counter()), 3),
+            'usage': usage_summary(usages.get(item_id, [])),
+        })
+
+
+def _shard_process(items: list[tuple[str, str]], options: BatchOptions, results: multiprocessing.Queue) -> None:
+    try:
+        asyncio.run(run_shard(items, options, results.put))
+    finally:
+        results.put(None)
+
+
+@dataclass
+class BatchStats:
+    items: int = 0
+    failed: int = 0
+    skipped: int = 0
+    tokens: int = 0
+    cost_usd: float = 0.0
+    seconds: float = 0.0
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items / self.seconds if self.seconds else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.seconds if self.seconds else 0.0
+
+
+def print_batch_stats(stats: BatchStats, file=sys.stderr) -> None:
+    print(' Batch '.center(30, '-'), file=file)
+    print(f'Items: {stats.items} ({stats.failed} failed, {stats.skipped} skipped)', file=file)
+    print(f'Elapsed: {stats.seconds:.1f}s', file=file)
+    print(f'Throughput: {stats.items_per_second:.2f} items/s, {stats.tokens_per_second:.0f} tokens/s', file=file)
+    print(f'Cost (USD): ${stats.cost_usd:.6f}', file=file)
+
+
+def run_batch(
+    input_path: Path,
+    output_path: Path,
+    options: BatchOptions,
+    processes: int = 1,
+    rate_limits: Path | None = None,
+) -> BatchStats:
+    done = completed_ids(output_path)
+    items = [item for item in read_inputs(input_path) if item[0] not in done]
+    stats = BatchStats(skipped=len(done))
+    options.limits = _scaled_limits(rate_limits, max(1, processes))
+    processes = max(1, min(processes, len(items)))
+    start = time.perf_counter()
+
+    with open(output_path, 'a', encoding='utf-8') as out:
+        def write(record: dict[str, Any]) -> None:
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            stats.items += 1
+            stats.failed += not record['ok']
+            stats.tokens += record['usage']['tokens']
+            stats.cost_usd += record['usage']['cost_usd']
+
+        if items and processes == 1:
+            asyncio.run(run_shard(items, options, write))
+        elif items:
+            # Children only run agents; this process owns the output file.
+            context = multiprocessing.get_context('spawn')
+            results = context.Queue()
+            workers = [
+                context.Process(target=_shard_process, args=(items[i::processes], options, results), daemon=True)
+                for i in range(processes)
+            ]
+            for worker in workers:
+                worker.start()
+            finished = 0
+            while finished < len(workers):
+                try:
+                    record = results.get(timeout=1)
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        break
+                    continue
+                if record is None:
+                    finished += 1
+                else:
+                    write(record)
+            for worker in workers:
+                worker.join()
+
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def cli(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog='run_agent.py batch', description='Run a YAML agent graph over a JSONL file of messages.')
+    parser.add_argument('yaml_path', type=Path, help='Path to the agent YAML file.')
+    parser.add_argument('input', type=Path, help='JSONL of messages: strings or {"id": ..., "message": ...} objects.')
+    parser.add_argument('output', type=Path, help='JSONL results file; items already answered in it are skipped.')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent agent runs per process.')
+    parser.add_argument('--processes', type=int, default=1, help='OS processes, each with its own event loop and client.')
+    parser.add_argument('--timeout', type=float, default=None, help='Per-item timeout in seconds.')
+    parser.add_argument('--rate-limits', type=Path, default=None, help='YAML mapping of model -> {rpm, tpm}, split across processes (no rate limiting without it).')
+    parser.add_argument('--cache-mode', choices=CACHE_MODES, default='passthrough', help='Response cache mode, as for a single run.')
+    parser.add_argument('--cache-dir', type=Path, default=None, help='Response cache directory (default: .response_cache).')
+    parser.add_argument('--prompt-layout', choices=('prefix', 'suffix'), default=None, help='Prompt layout for agents that do not set one.')
+    args = parser.parse_args(argv)
+    try:
+        read_inputs(args.input)
+    except ValueError as exc:
+        parser.error(str(exc))
+    options = BatchOptions(
+        yaml_path=args.yaml_path,
+        workers=args.workers,
+        timeout=args.timeout,
+        cache_mode=args.cache_mode,
+        cache_dir=args.cache_dir,
+        prompt_layout=args.prompt_layout,
+    )
+    stats = run_batch(args.input, args.output, options, args.processes, args.rate_limits)
+    print_batch_stats(stats)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,312 @@
+"""
+Offline benchmarks for the agent runtime (run_agent, as_tool, run_parallel_tools, ToolBox)
+driven by FakeAsyncOpenAI, so they measure runtime overhead rather than the network.
+
+    python benchmark.py
+    python benchmark.py --scenario wide_fanout --runs 200 --concurrency 16 --latency lognormal:0.02:0.5
+    python benchmark.py --registry
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from fake_client import (
+    FakeAsyncOpenAI,
+    Latency,
+    fixed,
+    function_call,
+    message,
+    parse_latency,
+    tool_names,
+    tool_outputs,
+)
+from run_agent import Agent, as_tool, current_toolbox, run_agent, run_parallel_tools
+from tools import ToolBox, generate_function_schema
+
+
+@dataclass
+class BenchResult:
+    scenario: str
+    runs: int
+    concurrency: int
+    wall_seconds: float
+    runs_per_second: float
+    requests_per_second: float
+    p50_ms: float
+    p99_ms: float
+    peak_kib_per_run: float
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _agent(name: str, tools: list[str], prompt: str = 'You are a benchmark agent.') -> Agent:
+    return {'name': name, 'description': name, 'model': 'gpt-5-nano', 'prompt': prompt, 'tools': tools, 'kwargs': {}}
+
+
+def _work_tool(tool_latency: Latency):
+    async def work(i: int) -> str:
+        """Simulated I/O-bound tool."""
+        await asyncio.sleep(tool_latency())
+        return f'result {i}'
+
+    return work
+
+
+# Each scenario builds a fresh client/toolbox and returns (client, one-run coroutine factory).
+Scenario = Callable[[Latency, Latency], tuple[FakeAsyncOpenAI, Callable[[], Awaitable[Any]]]]
+
+
+def deep_tool_loop(latency: Latency, tool_latency: Latency, depth: int = 20):
+    """One tool call per turn, `depth` turns in a row."""
+    def responder(request):
+        done = tool_outputs(request)
+        return [function_call('work', {'i': done})] if done < depth else [message('done')]
+
+    client = FakeAsyncOpenAI(responder, latency)
+    toolbox = ToolBox()
+    toolbox.tool(_work_tool(tool_latency))
+    agent = _agent('deep', ['work'])
+    return client, lambda: run_agent(client, toolbox, agent, 'go')
+
+
+def wide_fanout(latency: Latency, tool_latency: Latency, width: int = 32):
+    """One turn that issues `width` parallel tool calls."""
+    def responder(request):
+        if tool_outputs(request):
+            return [message('done')]
+        return [function_call('work', {'i': i}) for i in range(width)]
+
+    client = FakeAsyncOpenAI(responder, latency)
+    toolbox = ToolBox()
+    toolbox.tool(_work_tool(tool_latency))
+    agent = _agent('wide', ['work'])
+    return client, lambda: run_agent(client, toolbox, agent, 'go')
+
+
+def parallel_tools(latency: Latency, tool_latency: Latency, width: int = 32):
+    """Same fan-out as wide_fanout, but through a single run_parallel_tools call."""
+    calls = json.dumps([{'tool': 'work', 'args': {'i': i}} for i in range(width)])
+
+    def responder(request):
+        if tool_outputs(request):
+            return [message('done')]
+        return [function_call('run_parallel_tools', {'calls_json': calls})]
+
+    client = FakeAsyncOpenAI(responder, latency)
+    toolbox = ToolBox()
+    toolbox.tool(_work_tool(tool_latency))
+    toolbox.tool(run_parallel_tools)
+    agent = _agent('parallel', ['run_parallel_tools'])
+
+    async def run_once():
+        token = current_toolbox.set(toolbox)
+        try:
+            return await run_agent(client, toolbox, agent, 'go')
+        finally:
+            current_toolbox.reset(token)
+
+    return client, run_once
+
+
+def nested_agents(latency: Latency, tool_latency: Latency, depth: int = 4):
+    """A chain of `depth` sub-agents, each calling the next through as_tool."""
+    def responder(request):
+        children = [name for name in tool_names(request) if name.startswith('level_')]
+        if children and not tool_outputs(request):
+            return [function_call(children[0], {'input': 'go deeper'})]
+        return [message('done')]
+
+    client = FakeAsyncOpenAI(responder, latency)
+    toolbox = ToolBox()
+    for level in range(depth, 0, -1):
+        child = [f'level_{level + 1}'] if level < depth else []
+        toolbox.tool(as_tool(client, toolbox, _agent(f'level_{level}', child)))
+    agent = _agent('level_0', ['level_1'])
+    return client, lambda: run_agent(client, toolbox, agent, 'go')
+
+
+def large_history(latency: Latency, tool_latency: Latency, items: int = 2000, depth: int = 3):
+    """A short tool loop on top of a long pre-existing conversation."""
+    seed = [
+        {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f'earlier turn {i} ' + 'lorem ipsum ' * 20}
+        for i in range(items)
+    ]
+
+    def responder(request):
+        done = tool_outputs(request)
+        return [function_call('work', {'i': done})] if done < depth else [message('done')]
+
+    client = FakeAsyncOpenAI(responder, latency)
+    toolbox = ToolBox()
+    toolbox.tool(_work_tool(tool_latency))
+    agent = _agent('long', ['work'])
+    return client, lambda: run_agent(client, toolbox, agent, 'go', history=list(seed))
+
+
+SCENARIOS: dict[str, Scenario] = {
+    'deep_tool_loop': deep_tool_loop,
+    'wide_fanout': wide_fanout,
+    'parallel_tools': parallel_tools,
+    'nested_agents': nested_agents,
+    'large_history': large_history,
+}
+
+
+async def _timed(run_once) -> float:
+    start = time.perf_counter()
+    await run_once()
+    return time.perf_counter() - start
+
+
+async def run_scenario(
+    name: str,
+    runs: int = 50,
+    concurrency: int = 1,
+    latency: Latency | None = None,
+    tool_latency: Latency | None = None,
+) -> BenchResult:
+    latency = latency or fixed(0.0)
+    tool_latency = tool_latency or fixed(0.0)
+    client, run_once = SCENARIOS[name](latency, tool_latency)
+
+    # Memory is measured on a separate single run: tracemalloc would distort the timings.
+    tracemalloc.start()
+    await run_once()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    client.responses.requests = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded() -> float:
+        async with semaphore:
+            return await _timed(run_once)
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(bounded() for _ in range(runs)))
+    wall = time.perf_counter() - start
+
+    return BenchResult(
+        scenario=name,
+        runs=runs,
+        concurrency=concurrency,
+        wall_seconds=wall,
+        runs_per_second=runs / wall,
+        requests_per_second=client.responses.requests / wall,
+        p50_ms=_percentile(latencies, 0.50) * 1000,
+        p99_ms=_percentile(latencies, 0.99) * 1000,
+        peak_kib_per_run=peak / 1024,
+    )
+
+
+def print_results(results: list[BenchResult]) -> None:
+    header = f"{'scenario':<16}{'runs/s':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'peak KiB':>10}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(
+            f'{r.scenario:<16}{r.runs_per_second:>10.1f}{r.requests_per_second:>10.1f}'
+            f'{r.p50_ms:>10.2f}{r.p99_ms:>10.2f}{r.peak_kib_per_run:>10.1f}'
+        )
+
+
+def _make_tool(i: int):
+    def tool(query: str, limit: int, verbose: bool) -> str:
+        """Generated registry benchmark tool."""
+        return query
+
+    tool.__name__ = f'tool_{i}'
+    return tool
+
+
+def registry_benchmark(n_tools: int = 60, n_agents: int = 10, tools_per_agent: int = 8, lookups: int = 20_000) -> None:
+    """Cost of ToolBox registration and of the per-iteration get_tools lookup."""
+    funcs = [_make_tool(i) for i in range(n_tools)]
+    tool_sets = [
+        [f'tool_{(a * tools_per_agent + t) % n_tools}' for t in range(tools_per_agent)]
+        for a in range(n_agents)
+    ]
+
+    start = time.perf_counter()
+    for func in funcs:
+        generate_function_schema(func)
+    eager = time.perf_counter() - start
+
+    start = time.perf_counter()
+    toolbox = ToolBox()
+    for func in funcs:
+        toolbox.tool(func)
+    register = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for tool_set in tool_sets:
+        toolbox.get_tools(tool_set)
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(lookups):
+        toolbox.get_tools(tool_sets[i % n_agents])
+    cached = time.perf_counter() - start
+
+    def linear_scan(tool_names):
+        return [schema for schema in schemas if schema['name'] in tool_names]
+
+    schemas = [toolbox.schema(f.__name__) for f in funcs]
+    start = time.perf_counter()
+    for i in range(lookups):
+        linear_scan(tool_sets[i % n_agents])
+    scan = time.perf_counter() - start
+
+    print(f'{n_tools} tools, {n_agents} agents x {tools_per_agent} tools, {lookups} lookups')
+    print(f'eager schema generation: {eager / n_tools * 1e6:10.1f} us/tool')
+    print(f'lazy registration:       {register / n_tools * 1e6:10.1f} us/tool')
+    print(f'first get_tools:         {first / n_agents * 1e6:10.1f} us/agent')
+    print(f'cached get_tools:        {cached / lookups * 1e6:10.2f} us/lookup')
+    print(f'linear scan (old):       {scan / lookups * 1e6:10.2f} us/lookup')
+
+
+async def main(args) -> None:
+    names = args.scenario or list(SCENARIOS)
+    results = []
+    for name in names:
+        results.append(await run_scenario(
+            name,
+            runs=args.runs,
+            concurrency=args.concurrency,
+            latency=parse_latency(args.latency),
+            tool_latency=parse_latency(args.tool_latency),
+        ))
+    print_results(results)
+    if args.json:
+        args.json.write_text(json.dumps([asdict(r) for r in results], indent=2), encoding='utf-8')
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the agent runtime against a fake Responses client.')
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help='Scenario to run (repeatable; default: all).')
+    parser.add_argument('--runs', type=int, default=50, help='Agent runs per scenario.')
+    parser.add_argument('--concurrency', type=int, default=1, help='Agent runs in flight at once.')
+    parser.add_argument('--latency', default='fixed:0', help="Model latency, e.g. 'fixed:0.05', 'uniform:0.02:0.08', 'lognormal:0.05:0.6'.")
+    parser.add_argument('--tool-latency', default='fixed:0', help='Latency of the simulated work tool, same format.')
+    parser.add_argument('--json', type=Path, default=None, help='Also write results as JSON to this path.')
+    parser.add_argument('--registry', action='store_true', help='Run the ToolBox registration/lookup micro-benchmark instead.')
+    args = parser.parse_args()
+    if args.registry:
+        registry_benchmark()
+        return
+    asyncio.run(main(args))
+
+
+if __name__ == '__main__':
+    cli()
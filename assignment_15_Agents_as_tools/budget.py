@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import json
+import logging
+import sys
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+from usage import response_cost_usd
+
+logger = logging.getLogger(__name__)
+
+# Model an over-budget agent falls back to, keyed by the `model` field used in agent YAML.
+DOWNGRADES = {
+    'gpt-5.4': 'gpt-5-mini',
+    'gpt-5.3-codex': 'gpt-5-mini',
+    'gpt-5.2': 'gpt-5-mini',
+    'gpt-5.1': 'gpt-5-mini',
+    'gpt-5': 'gpt-5-mini',
+    'gpt-5-mini': 'gpt-5-nano',
+    'gpt-4.1': 'gpt-4.1-mini',
+    'gpt-4.1-mini': 'gpt-4.1-nano',
+}
+# Fraction of a ceiling at which agents are moved to a cheaper model.
+DOWNGRADE_AT = 0.8
+CONCLUDE_NOTE = 'Budget exhausted: stop calling tools and give your final answer now.'
+
+
+class BudgetExceeded(RuntimeError):
+    pass
+
+
+@dataclass
+class Limits:
+    max_tokens: int | None = None
+    max_usd: float | None = None
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any] | None) -> Limits | None:
+        if not config:
+            return None
+        return cls(max_tokens=config.get('max_tokens'), max_usd=config.get('max_usd'))
+
+    def fraction(self, spend: Spend) -> float:
+        """How much of the tighter ceiling `spend` has used (1.0 = exhausted)."""
+        used = 0.0
+        if self.max_tokens:
+            used = max(used, spend.tokens / self.max_tokens)
+        if self.max_usd:
+            used = max(used, spend.usd / self.max_usd)
+        return used
+
+
+@dataclass
+class Spend:
+    requests: int = 0
+    tokens: int = 0
+    usd: float = 0.0
+
+
+@dataclass
+class Budget:
+    """
+    Running spend for one run, charged after every response. Ceilings apply to the
+    whole run (`limits`) and to each agent name (the agent's `budget` YAML key, summed
+    over every invocation of that agent). Near a ceiling the agent is moved to a
+    cheaper model; at the ceiling it gets one last turn forced to conclude.
+    """
+    limits: Limits | None = None
+    downgrade_at: float = DOWNGRADE_AT
+    total: Spend = field(default_factory=Spend)
+    agents: dict[str, Spend] = field(default_factory=dict)
+
+    def charge(self, agent_name: str, model: str, usage) -> None:
+        if usage is None:
+            return
+        cost = response_cost_usd(model, usage)
+        for spend in (self.total, self.agents.setdefault(agent_name, Spend())):
+            spend.requests += 1
+            spend.tokens += usage.total_tokens
+            spend.usd += cost
+
+    def used(self, agent: dict[str, Any]) -> float:
+        fractions = [0.0]
+        if self.limits:
+            fractions.append(self.limits.fraction(self.total))
+        if agent_limits := Limits.from_config(agent.get('budget')):
+            fractions.append(agent_limits.fraction(self.agents.get(agent['name'], Spend())))
+        return max(fractions)
+
+    def gate(self, agent: dict[str, Any], request: dict[str, Any], forced: bool) -> bool:
+        """
+        Adjust `request` for the current spend. Returns True when the request was
+        forced to conclude; raises BudgetExceeded if the agent already had that turn.
+        """
+        used = self.used(agent)
+        if used >= 1.0:
+            if forced:
+                raise BudgetExceeded(f"Agent {agent['name']} is over budget: {self.describe(agent['name'])}")
+            logger.warning('Budget exhausted for %s, forcing a final turn', agent['name'])
+            request['input'] = [*request['input'], {'role': 'system', 'content': CONCLUDE_NOTE}]
+            if 'conclude' in agent.get('tools', []):
+                request['tool_choice'] = {'type': 'function', 'name': 'conclude'}
+            else:
+                request['tool_choice'] = 'none'
+            forced = True
+        if used >= self.downgrade_at and (cheaper := DOWNGRADES.get(request['model'])):
+            logger.info('Budget at %.0f%% for %s, using %s instead of %s', used * 100, agent['name'], cheaper, request['model'])
+            request['model'] = cheaper
+        return forced
+
+    def describe(self, agent_name: str | None = None) -> str:
+        spend = self.agents.get(agent_name, Spend()) if agent_name else self.total
+        return f'{spend.tokens} tokens, ${spend.usd:.6f} over {spend.requests} requests'
+
+    def snapshot(self, agent_name: str | None = None) -> dict[str, Any]:
+        snapshot = {
+            'total': asdict(self.total),
+            'limits': asdict(self.limits) if self.limits else None,
+        }
+        if agent_name:
+            snapshot['agent'] = {'name': agent_name, **asdict(self.agents.get(agent_name, Spend()))}
+        return snapshot
+
+
+current_budget: ContextVar[Budget | None] = ContextVar('current_budget', default=None)
+
+
+def print_budget(budget: Budget, file=sys.stderr):
+    print(' Budget '.center(30, '-'), file=file)
+    if budget.limits:
+        print('Limits:', json.dumps(asdict(budget.limits)), file=file)
+    for name, spend in budget.agents.items():
+        print(f'{name}:', budget.describe(name), file=file)
+    print('Total:', budget.describe(), file=file)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator
+
+from openai.types.responses import ResponseUsage
+
+logger = logging.getLogger(__name__)
+
+
+def _jsonable(item: Any) -> Any:
+    if hasattr(item, 'model_dump'):
+        return item.model_dump(mode='json', exclude_none=True)
+    return item
+
+
+@dataclass
+class AgentState:
+    """What the log knows about one agent run, identified by its path in the call tree."""
+    history: list[Any] = field(default_factory=list)
+    outputs: dict[str, str] = field(default_factory=dict)
+    finished: bool = False
+    result: str | None = None
+
+
+def path_agents(path: str) -> tuple[str, str]:
+    """(agent, call site) of the agent run at path; the call site is 'root' for the top-level run."""
+    names = [segment.split('@')[0].split('#')[0] for segment in path.split('/')]
+    return names[-1], names[-2] if len(names) > 1 else 'root'
+
+
+def new_run_id() -> str:
+    return time.strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+
+
+class Checkpoint:
+    """
+    Append-only JSONL log of a run. Every record carries the `path` of the agent
+    run it belongs to ('main', 'main/senior_developer@call_x', ...), so nested
+    agents resume independently:
+
+      step   - history items added since the previous step (or all of them after
+               compaction, with reset) plus that request's usage
+      output - one finished tool call's output, by call_id
+      result - the agent run finished with this answer
+
+    The file is flushed and fsynced per record; a line cut short by a crash is skipped.
+    """
+
+    def __init__(self, log_path: str | Path, run_id: str):
+        self.path = Path(log_path)
+        self.run_id = run_id
+        self.meta: dict[str, Any] = {}
+        self._states: dict[str, AgentState] = {}
+        self._usage: list[tuple[str, str, ResponseUsage]] = []
+        self._saved: dict[str, int] = {}
+        self._claims: dict[str, int] = {}
+        if self.path.exists():
+            self._load()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    @classmethod
+    def open(cls, checkpoint_dir: str | Path, run_id: str | None = None) -> Checkpoint:
+        run_id = run_id or new_run_id()
+        return cls(Path(checkpoint_dir) / f'{run_id}.jsonl', run_id)
+
+    def _load(self) -> None:
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning('Skipping truncated checkpoint record in %s', self.path)
+                    continue
+                kind = record.get('kind')
+                if kind == 'run':
+                    self.meta = record.get('meta', {})
+                    continue
+                state = self._states.setdefault(record['path'], AgentState())
+                if kind == 'step':
+                    if record.get('reset'):
+                        state.history = []
+                    state.history.extend(record['items'])
+                    if record.get('usage'):
+                        usage = ResponseUsage.model_validate(record['usage'])
+                        self._usage.append((record['path'], record['model'], usage))
+                elif kind == 'output':
+                    state.outputs[record['call_id']] = record['output']
+                elif kind == 'result':
+                    state.finished = True
+                    state.result = record.get('result')
+
+    def _append(self, record: dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, separators=(',', ':'), default=str) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def start(self, **meta: Any) -> None:
+        """Record run metadata (e.g. the first message) unless resuming a run that has it."""
+        if not self.meta:
+            self.meta = meta
+            self._append({'kind': 'run', 'meta': meta})
+
+    def claim(self, base: str) -> str:
+        """
+        A unique path for an agent run. The same base is claimed again when one tool
+        call starts several runs (run_agent_map); they get #1, #2, ... in start order,
+        which a resumed run reproduces.
+        """
+        n = self._claims.get(base, 0)
+        self._claims[base] = n + 1
+        return base if n == 0 else f'{base}#{n}'
+
+    def restore(self, path: str, history: list) -> AgentState | None:
+        """Replace `history` with the logged one for `path`; None if `path` never ran."""
+        state = self._states.get(path)
+        if state is None:
+            return None
+        history[:] = state.history
+        self._saved[path] = len(history)
+        return state
+
+    def usage(self) -> Iterator[tuple[str, str, ResponseUsage]]:
+        """(path, model, usage) of every logged request, to re-account a resumed run."""
+        return iter(self._usage)
+
+    def output(self, path: str, call_id: str) -> str | None:
+        state = self._states.get(path)
+        return state.outputs.get(call_id) if state else None
+
+    def save_step(self, path: str, history: list, model: str, usage: ResponseUsage | None, reset: bool = False) -> None:
+        saved = self._saved.get(path, 0)
+        if reset or saved > len(history):
+            saved, reset = 0, True
+        self._append({
+            'kind': 'step',
+            'path': path,
+            'reset': reset,
+            'items': [_jsonable(item) for item in history[saved:]],
+            'model': model,
+            'usage': usage.model_dump(mode='json') if usage is not None else None,
+        })
+        self._saved[path] = len(history)
+
+    def save_output(self, path: str, call_id: str, output: Any) -> None:
+        self._append({'kind': 'output', 'path': path, 'call_id': call_id, 'output': str(output)})
+
+    def save_result(self, path: str, result: str | None) -> None:
+        self._append({'kind': 'result', 'path': path, 'result': result})
+
+    def close(self) -> None:
+        self._file.close()
+
+
+current_checkpoint: ContextVar[Checkpoint | None] = ContextVar('current_checkpoint', default=None)
+# Path of the agent run in the current context, and the tool call that started the code running in it.
+current_run_path: ContextVar[str | None] = ContextVar('current_run_path', default=None)
+current_call_id: ContextVar[str | None] = ContextVar('current_call_id', default=None)
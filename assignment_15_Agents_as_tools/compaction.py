@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MARKER = '[Earlier conversation compacted]'
+# Compact down to this fraction of the budget so we don't compact again next turn.
+TARGET_RATIO = 0.75
+DIGEST_CHARS = 200
+MAX_DIGEST_LINES = 40
+
+
+def _field(item, name: str):
+    if isinstance(item, dict):
+        return item.get(name)
+    return getattr(item, name, None)
+
+
+def _jsonable(value: Any) -> Any:
+    if hasattr(value, 'model_dump'):
+        return value.model_dump(mode='json', exclude_none=True)
+    return value
+
+
+def count_tokens(value: Any) -> int:
+    """Local token estimate (~4 characters per token of the JSON payload); no API call."""
+    if isinstance(value, str):
+        return len(value) // 4 + 1
+    if isinstance(value, list):
+        value = [_jsonable(v) for v in value]
+    return len(json.dumps(_jsonable(value), default=str)) // 4 + 1
+
+
+def _is_summary(item) -> bool:
+    content = _field(item, 'content')
+    return isinstance(content, str) and content.startswith(SUMMARY_MARKER)
+
+
+def _group_units(history: list) -> list[list[int]]:
+    """
+    Group history indices into units that must be kept or evicted together:
+    a function_call travels with its function_call_output, and reasoning items
+    travel with whatever follows them.
+    """
+    units: list[list[int]] = []
+    call_units: dict[str, list[int]] = {}
+    pending: list[int] = []
+
+    for i, item in enumerate(history):
+        item_type = _field(item, 'type')
+        if item_type == 'reasoning':
+            pending.append(i)
+            continue
+        if item_type == 'function_call_output' and (unit := call_units.get(_field(item, 'call_id'))):
+            unit.append(i)
+            continue
+        unit = pending + [i]
+        pending = []
+        units.append(unit)
+        if item_type == 'function_call':
+            call_units[_field(item, 'call_id')] = unit
+    if pending:
+        units.append(pending)
+    return units
+
+
+def _digest(item) -> str | None:
+    item_type = _field(item, 'type')
+    if _is_summary(item):
+        return None
+    if item_type == 'function_call':
+        return f"called {_field(item, 'name')}({_field(item, 'arguments')})"[:DIGEST_CHARS]
+    if item_type == 'function_call_output':
+        return f"tool result: {_field(item, 'output')}"[:DIGEST_CHARS]
+    if item_type == 'reasoning':
+        return None
+
+    content = _field(item, 'content')
+    if isinstance(content, list):
+        content = ' '.join(str(_field(chunk, 'text') or '') for chunk in content)
+    role = _field(item, 'role') or item_type
+    return f'{role}: {content}'[:DIGEST_CHARS]
+
+
+def _summary_item(previous: list[str], evicted: list, max_lines: int = MAX_DIGEST_LINES) -> dict[str, str]:
+    lines = previous + [f'- {line}' for item in evicted if (line := _digest(item))]
+    lines = lines[len(lines) - max_lines:] if len(lines) > max_lines else lines
+    return {'role': 'system', 'content': '\n'.join([SUMMARY_MARKER, *lines])}
+
+
+def compact_history(history: list, max_input_tokens: int, reserved_tokens: int = 0) -> int:
+    """
+    Evict the oldest units of `history` in place until it fits the budget, replacing
+    them with one short digest item. The most recent user message and the last unit
+    are always kept. Returns the estimated number of tokens removed.
+    """
+    budget = max_input_tokens - reserved_tokens
+    if sum(count_tokens(item) for item in history) <= budget:
+        return 0
+
+    previous: list[str] = []
+    body = history
+    if history and _is_summary(history[0]):
+        previous = _field(history[0], 'content').splitlines()[1:]
+        body = history[1:]
+
+    sizes = [count_tokens(item) for item in body]
+    kept = sum(sizes)
+    units = _group_units(body)
+    last_user = max(
+        (u for u, unit in enumerate(units) if any(_field(body[i], 'role') == 'user' for i in unit)),
+        default=None,
+    )
+
+    def evicted_items() -> list:
+        return [body[i] for i in sorted(evict)]
+
+    # The digest grows as units are evicted, so it is counted on every step.
+    target = int(budget * TARGET_RATIO)
+    evict: set[int] = set()
+    total = kept + count_tokens(_summary_item(previous, []))
+    for u, unit in enumerate(units[:-1]):
+        if total <= target:
+            break
+        if u == last_user:
+            continue
+        evict.update(unit)
+        kept -= sum(sizes[i] for i in unit)
+        total = kept + count_tokens(_summary_item(previous, evicted_items()))
+
+    if not evict:
+        return 0
+
+    # If the digest alone keeps history over target, drop its oldest lines so the
+    # next turn does not compact again.
+    evicted = evicted_items()
+    max_lines = MAX_DIGEST_LINES
+    summary = _summary_item(previous, evicted, max_lines)
+    while max_lines > 0 and kept + count_tokens(summary) > target:
+        max_lines -= 1
+        summary = _summary_item(previous, evicted, max_lines)
+
+    before = sum(count_tokens(item) for item in history)
+    history[:] = [summary] + [item for i, item in enumerate(body) if i not in evict]
+    removed = before - sum(count_tokens(item) for item in history)
+    logger.debug('Compacted %d history items (~%d tokens)', len(evicted), removed)
+    return removed
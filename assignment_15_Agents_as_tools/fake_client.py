@@ -0,0 +1,166 @@
+"""
+In-process stand-in for AsyncOpenAI that serves scripted Responses API output
+with configurable latency, so the agent runtime can be exercised offline.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import math
+import random
+from typing import Any, Callable
+
+from openai.types.responses import Response
+
+from compaction import count_tokens
+
+Responder = Callable[[dict[str, Any]], list[dict[str, Any]]]
+Latency = Callable[[], float]
+
+
+def fixed(seconds: float) -> Latency:
+    return lambda: seconds
+
+
+def uniform(low: float, high: float) -> Latency:
+    return lambda: random.uniform(low, high)
+
+
+def lognormal(median: float, sigma: float = 0.5) -> Latency:
+    """Long-tailed latency, closer to real API timings than uniform."""
+    mu = math.log(median) if median > 0 else 0.0
+    return lambda: random.lognormvariate(mu, sigma) if median > 0 else 0.0
+
+
+def parse_latency(spec: str) -> Latency:
+    """Parse 'fixed:0.05', 'uniform:0.02:0.08' or 'lognormal:0.05:0.6'."""
+    kind, *args = spec.split(':')
+    factories = {'fixed': fixed, 'uniform': uniform, 'lognormal': lognormal}
+    if kind not in factories:
+        raise ValueError(f'Unknown latency distribution: {kind}')
+    return factories[kind](*(float(a) for a in args))
+
+
+_ids = itertools.count(1)
+
+
+def message(text: str) -> dict[str, Any]:
+    return {
+        'type': 'message',
+        'id': f'msg_{next(_ids)}',
+        'role': 'assistant',
+        'status': 'completed',
+        'content': [{'type': 'output_text', 'text': text, 'annotations': []}],
+    }
+
+
+def function_call(name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+    n = next(_ids)
+    return {
+        'type': 'function_call',
+        'id': f'fc_{n}',
+        'call_id': f'call_{n}',
+        'name': name,
+        'arguments': json.dumps(arguments),
+        'status': 'completed',
+    }
+
+
+def scripted(outputs: list[list[dict[str, Any]]]) -> Responder:
+    """Replay a fixed sequence of outputs, one list of items per request."""
+    queue = list(outputs)
+    return lambda request: queue.pop(0)
+
+
+def _field(item, name: str):
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+def tool_outputs(request: dict[str, Any]) -> int:
+    """Number of function_call_output items already in the request input."""
+    return sum(1 for item in request.get('input', []) if _field(item, 'type') == 'function_call_output')
+
+
+def tool_names(request: dict[str, Any]) -> list[str]:
+    return [tool.get('name') for tool in request.get('tools', []) if tool.get('type') == 'function']
+
+
+def build_response(request: dict[str, Any], output: list[dict[str, Any]]) -> Response:
+    output_tokens = count_tokens(output)
+    return Response.model_validate({
+        'id': f'resp_{next(_ids)}',
+        'created_at': 0,
+        'model': request.get('model', 'gpt-5-mini'),
+        'object': 'response',
+        'output': output,
+        'parallel_tool_calls': True,
+        'tool_choice': 'auto',
+        'tools': [],
+        'usage': {
+            'input_tokens': count_tokens(request.get('input', [])),
+            'input_tokens_details': {'cached_tokens': 0, 'cache_write_tokens': 0},
+            'output_tokens': output_tokens,
+            'output_tokens_details': {'reasoning_tokens': 0},
+            'total_tokens': count_tokens(request.get('input', [])) + output_tokens,
+        },
+    })
+
+
+class _Event:
+    def __init__(self, type: str, **fields):
+        self.type = type
+        self.__dict__.update(fields)
+
+
+class _FakeStream:
+    def __init__(self, responses: FakeResponses, request: dict[str, Any]):
+        self._responses = responses
+        self._request = request
+        self._response: Response | None = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def __aiter__(self):
+        self._response = self._responses._respond(self._request)
+        items = self._response.output
+        # Spread the latency across items so early tool dispatch has something to overlap with.
+        delay = self._responses.latency() / max(len(items), 1)
+        for item in items:
+            await asyncio.sleep(delay)
+            if item.type == 'message':
+                for chunk in item.content:
+                    yield _Event('response.output_text.delta', delta=chunk.text)
+            yield _Event('response.output_item.done', item=item)
+
+    async def get_final_response(self) -> Response:
+        return self._response
+
+
+class FakeResponses:
+    def __init__(self, responder: Responder, latency: Latency):
+        self.responder = responder
+        self.latency = latency
+        self.requests = 0
+
+    def _respond(self, request: dict[str, Any]) -> Response:
+        self.requests += 1
+        return build_response(request, self.responder(request))
+
+    async def create(self, **request: Any) -> Response:
+        await asyncio.sleep(self.latency())
+        return self._respond(request)
+
+    def stream(self, **request: Any) -> _FakeStream:
+        return _FakeStream(self, request)
+
+
+class FakeAsyncOpenAI:
+    """Drop-in for AsyncOpenAI exposing only client.responses.create/stream."""
+
+    def __init__(self, responder: Responder, latency: Latency | None = None):
+        self.responses = FakeResponses(responder, latency or fixed(0.0))
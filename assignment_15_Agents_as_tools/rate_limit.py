@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import yaml
+from openai import RateLimitError
+
+from compaction import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Requests and tokens per minute, keyed by the `model` field used in agent YAML.
+# Conservative tier-1 values that a --rate-limits file is layered over; models the file
+# does not list keep these.
+DEFAULT_LIMITS = {
+    'gpt-5-nano': {'rpm': 500, 'tpm': 200_000},
+    'gpt-5-mini': {'rpm': 500, 'tpm': 200_000},
+    'gpt-5': {'rpm': 500, 'tpm': 30_000},
+    'gpt-4.1-nano': {'rpm': 500, 'tpm': 200_000},
+    'gpt-4.1-mini': {'rpm': 500, 'tpm': 200_000},
+    'gpt-4.1': {'rpm': 500, 'tpm': 30_000},
+}
+FALLBACK_LIMITS = {'rpm': 500, 'tpm': 30_000}
+
+
+def load_limits(path: str | Path) -> dict[str, dict[str, int]]:
+    """Read a YAML mapping of model -> {rpm, tpm}, layered over DEFAULT_LIMITS."""
+    overrides = yaml.safe_load(Path(path).read_text(encoding='utf-8')) or {}
+    limits = {model: dict(values) for model, values in DEFAULT_LIMITS.items()}
+    for model, values in overrides.items():
+        limits.setdefault(model, dict(FALLBACK_LIMITS)).update(values)
+    return limits
+
+
+def estimate_tokens(request: dict[str, Any]) -> int:
+    """Pre-flight token count used to charge the TPM bucket."""
+    input_tokens = count_tokens(request.get('input', '')) + count_tokens(request.get('tools', []))
+    return input_tokens + int(request.get('max_output_tokens') or 0)
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding at most `per_minute` units."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        # Requests larger than the bucket wait for a full bucket instead of forever.
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, amount: float) -> None:
+        """Charge (positive) or refund (negative) once the actual usage is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+@dataclass
+class ModelMetrics:
+    requests: int = 0
+    queued: int = 0
+    max_queued: int = 0
+    wait_seconds: float = 0.0
+    retries: int = 0
+    rate_limited: int = 0
+
+
+@dataclass
+class _ModelState:
+    requests: TokenBucket
+    tokens: TokenBucket
+    metrics: ModelMetrics = field(default_factory=ModelMetrics)
+
+
+class RateLimiter:
+    """Shared scheduler that gates every Responses API call by per-model RPM/TPM buckets."""
+
+    def __init__(
+        self,
+        limits: dict[str, dict[str, int]] | None = None,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.limits = limits if limits is not None else DEFAULT_LIMITS
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._models: dict[str, _ModelState] = {}
+
+    def _state(self, model: str) -> _ModelState:
+        if model not in self._models:
+            limits = self.limits.get(model, FALLBACK_LIMITS)
+            self._models[model] = _ModelState(TokenBucket(limits['rpm']), TokenBucket(limits['tpm']))
+        return self._models[model]
+
+    async def acquire(self, model: str, estimated_tokens: int) -> None:
+        state = self._state(model)
+        metrics = state.metrics
+        metrics.queued += 1
+        metrics.max_queued = max(metrics.max_queued, metrics.queued)
+        start = time.monotonic()
+        try:
+            await state.requests.acquire(1)
+            await state.tokens.acquire(estimated_tokens)
+        finally:
+            metrics.queued -= 1
+            metrics.wait_seconds += time.monotonic() - start
+        metrics.requests += 1
+
+    def record_usage(self, model: str, estimated_tokens: int, usage) -> None:
+        if usage is not None:
+            self._state(model).tokens.adjust(usage.total_tokens - estimated_tokens)
+
+    def _retry_delay(self, exc: RateLimitError, attempt: int) -> float:
+        retry_after = exc.response.headers.get('retry-after') if exc.response is not None else None
+        try:
+            if retry_after is not None:
+                return float(retry_after)
+        except ValueError:
+            pass
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay * (0.5 + random.random() / 2)
+
+    async def retrying(self, model: str, estimated_tokens: int, attempt_fn):
+        """Await attempt_fn() once the buckets allow it, retrying 429s with retry-after or backoff."""
+        state = self._state(model)
+        attempt = 0
+        while True:
+            await self.acquire(model, estimated_tokens)
+            try:
+                return await attempt_fn()
+            except RateLimitError as exc:
+                state.metrics.rate_limited += 1
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(exc, attempt)
+                # Drain the bucket so queued callers back off too instead of piling on.
+                state.tokens.tokens = 0
+                state.metrics.retries += 1
+                logger.warning('429 from %s, retrying in %.1fs (attempt %d)', model, delay, attempt + 1)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def call(self, create_fn, **request: Any):
+        model = request.get('model', 'gpt-5-mini')
+        estimated = estimate_tokens(request)
+        response = await self.retrying(model, estimated, lambda: create_fn(**request))
+        self.record_usage(model, estimated, getattr(response, 'usage', None))
+        return response
+
+    def metrics(self) -> dict[str, dict[str, Any]]:
+        return {model: vars(state.metrics).copy() for model, state in self._models.items()}
+
+
+def print_rate_limit_metrics(limiter: RateLimiter, file=sys.stderr):
+    print(' Rate limits '.center(30, '-'), file=file)
+    for model, metrics in limiter.metrics().items():
+        print(model.center(30, '~'), file=file)
+        for key, value in metrics.items():
+            if isinstance(value, float):
+                value = f'{value:.2f}'
+            print(f"{key.replace('_', ' ').title()}:", value, file=file)
+
+
+class _RateLimitedStream:
+    """
+    Opening the stream is what sends the request, so __aenter__ gets the same
+    bucket and 429 retry handling as create; usage is reconciled on a clean exit.
+    """
+
+    def __init__(self, limiter: RateLimiter, stream_fn, request: dict[str, Any]):
+        self._limiter = limiter
+        self._stream_fn = stream_fn
+        self._request = request
+        self._model = request.get('model', 'gpt-5-mini')
+        self._estimated = estimate_tokens(request)
+        self._manager = None
+        self._stream = None
+
+    async def _open(self):
+        manager = self._stream_fn(**self._request)
+        stream = await manager.__aenter__()
+        self._manager = manager
+        return stream
+
+    async def __aenter__(self):
+        self._stream = await self._limiter.retrying(self._model, self._estimated, self._open)
+        return self._stream
+
+    async def __aexit__(self, *exc_info):
+        try:
+            if exc_info[0] is None:
+                response = await self._stream.get_final_response()
+                self._limiter.record_usage(self._model, self._estimated, getattr(response, 'usage', None))
+        finally:
+            return_value = await self._manager.__aexit__(*exc_info)
+        return return_value
+
+
+class _RateLimitedResponses:
+    def __init__(self, responses, limiter: RateLimiter):
+        self._responses = responses
+        self._limiter = limiter
+
+    async def create(self, **request: Any):
+        return await self._limiter.call(self._responses.create, **request)
+
+    def stream(self, **request: Any):
+        return _RateLimitedStream(self._limiter, self._responses.stream, request)
+
+    def __getattr__(self, name):
+        return getattr(self._responses, name)
+
+
+class RateLimitedClient:
+    """Wraps an AsyncOpenAI client so every responses call is scheduled through a RateLimiter."""
+
+    def __init__(self, client, limiter: RateLimiter):
+        self._client = client
+        self.limiter = limiter
+        self.responses = _RateLimitedResponses(client.responses, limiter)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
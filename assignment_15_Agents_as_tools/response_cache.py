@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, AsyncIterator, Literal
+
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseOutputItemDoneEvent,
+    ResponseStreamEvent,
+    ResponseTextDeltaEvent,
+)
+
+logger = logging.getLogger(__name__)
+
+CacheMode = Literal['record', 'replay', 'passthrough']
+CACHE_MODES: tuple[str, ...] = ('record', 'replay', 'passthrough')
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def _to_jsonable(value: Any) -> Any:
+    # History mixes plain dicts with pydantic output items from earlier responses.
+    if hasattr(value, 'model_dump'):
+        return value.model_dump(mode='json', exclude_none=True)
+    if isinstance(value, dict):
+        return {str(k): _to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_jsonable(v) for v in value]
+    return value
+
+
+def request_key(**request: Any) -> str:
+    """Stable sha256 over model, input history, tool schemas and kwargs."""
+    payload = json.dumps(_to_jsonable(request), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk store of Responses API results, one JSON file per request hash.
+    When the directory grows past max_bytes the least recently used entries are evicted.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path = '.response_cache',
+        mode: CacheMode = 'record',
+        max_bytes: int = 256 * 1024 * 1024,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f'Unknown cache mode: {mode}')
+        self.cache_dir = Path(cache_dir)
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if mode != 'passthrough':
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f'{key}.json'
+
+    def get(self, key: str) -> Response | None:
+        path = self._path(key)
+        try:
+            raw = path.read_text(encoding='utf-8')
+        except FileNotFoundError:
+            return None
+        # Touch so eviction is least-recently-used rather than oldest-written.
+        os.utime(path)
+        return Response.model_validate_json(raw)
+
+    def put(self, key: str, response: Response) -> None:
+        path = self._path(key)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(response.model_dump_json(), encoding='utf-8')
+        tmp_path.replace(path)
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = [(p.stat(), p) for p in self.cache_dir.glob('*.json')]
+        total = sum(st.st_size for st, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for st, path in sorted(entries, key=lambda e: e[0].st_mtime):
+            path.unlink(missing_ok=True)
+            total -= st.st_size
+            logger.debug('Evicted cached response %s', path.name)
+            if total <= self.max_bytes:
+                break
+
+    async def create(self, create_fn, **request: Any) -> Response:
+        if self.mode == 'passthrough':
+            return await create_fn(**request)
+
+        key = request_key(**request)
+        if (cached := self.get(key)) is not None:
+            self.hits += 1
+            logger.debug('Response cache hit %s', key[:12])
+            return cached
+
+        self.misses += 1
+        if self.mode == 'replay':
+            raise CacheMiss(f'No recorded response for request {key[:12]} in {self.cache_dir}')
+
+        response = await create_fn(**request)
+        self.put(key, response)
+        return response
+
+
+def _replay_events(response: Response) -> AsyncIterator[ResponseStreamEvent]:
+    """The text deltas and finished items a live stream would have produced for response."""
+
+    async def events():
+        sequence = 0
+        for index, item in enumerate(response.output):
+            if item.type == 'message':
+                for content_index, chunk in enumerate(item.content):
+                    if chunk.type == 'output_text':
+                        yield ResponseTextDeltaEvent(
+                            type='response.output_text.delta', delta=chunk.text, item_id=item.id,
+                            output_index=index, content_index=content_index, logprobs=[],
+                            sequence_number=sequence,
+                        )
+                        sequence += 1
+            yield ResponseOutputItemDoneEvent(
+                type='response.output_item.done', item=item, output_index=index, sequence_number=sequence,
+            )
+            sequence += 1
+        yield ResponseCompletedEvent(type='response.completed', response=response, sequence_number=sequence)
+
+    return events()
+
+
+class _CachedStream:
+    """
+    responses.stream through a ResponseCache: a hit replays the recorded Response
+    as stream events without a request; a miss in record mode streams live and
+    records the final response.
+    """
+
+    def __init__(self, responses, cache: ResponseCache, request: dict[str, Any]):
+        self._responses = responses
+        self._cache = cache
+        self._request = request
+        self._key = request_key(**request)
+        self._cached: Response | None = None
+        self._stream_manager = None
+        self._stream = None
+
+    async def __aenter__(self):
+        if (cached := self._cache.get(self._key)) is not None:
+            self._cache.hits += 1
+            logger.debug('Response cache hit %s', self._key[:12])
+            self._cached = cached
+            return self
+
+        self._cache.misses += 1
+        if self._cache.mode == 'replay':
+            raise CacheMiss(f'No recorded response for request {self._key[:12]} in {self._cache.cache_dir}')
+        self._stream_manager = self._responses.stream(**self._request)
+        self._stream = await self._stream_manager.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._stream_manager is not None:
+            return await self._stream_manager.__aexit__(*exc_info)
+        return False
+
+    def __aiter__(self) -> AsyncIterator[ResponseStreamEvent]:
+        if self._cached is not None:
+            return _replay_events(self._cached)
+        return self._stream.__aiter__()
+
+    async def get_final_response(self) -> Response:
+        if self._cached is not None:
+            return self._cached
+        response = await self._stream.get_final_response()
+        self._cache.put(self._key, response)
+        return response
+
+
+class _CachedResponses:
+    def __init__(self, responses, cache: ResponseCache):
+        self._responses = responses
+        self._cache = cache
+
+    async def create(self, **request: Any) -> Response:
+        return await self._cache.create(self._responses.create, **request)
+
+    def stream(self, **request: Any):
+        if self._cache.mode == 'passthrough':
+            return self._responses.stream(**request)
+        return _CachedStream(self._responses, self._cache, request)
+
+    def __getattr__(self, name):
+        return getattr(self._responses, name)
+
+
+class CachedClient:
+    """Wraps an AsyncOpenAI client so responses.create and responses.stream go through a ResponseCache."""
+
+    def __init__(self, client, cache: ResponseCache):
+        self._client = client
+        self.cache = cache
+        self.responses = _CachedResponses(client.responses, cache)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
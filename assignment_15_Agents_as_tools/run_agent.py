@@ -2,24 +2,41 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import hashlib
 import json
 import logging
+import os
+import re
 import subprocess
 import sys
 import time
+from contextlib import contextmanager
 from contextvars import ContextVar
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Any, Callable, Iterable, TypedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, NotRequired, TypedDict
 
 import yaml
-from openai import AsyncOpenAI
-
-from tools import ToolBox
-from usage import print_usage
+from openai import AsyncOpenAI, BadRequestError, DefaultAsyncHttpxClient, NotFoundError
+from openai._constants import DEFAULT_CONNECTION_LIMITS
+from openai.types.responses import ResponseFunctionToolCall
+
+from budget import Budget, Limits, current_budget, print_budget
+from checkpoint import AgentState, Checkpoint, current_call_id, current_checkpoint, current_run_path, path_agents
+from compaction import compact_history, count_tokens
+from rate_limit import RateLimitedClient, RateLimiter, load_limits, print_rate_limit_metrics
+from response_cache import CACHE_MODES, CachedClient, ResponseCache
+from tools import ToolBox, execution, memoize
+from tracing import Tracer, current_span, current_tracer, record_response, trace_span
+from usage import CompactionSavings, UsageMeter, current_meter, print_tool_cache, print_usage, print_usage_by_agent
 
 logger = logging.getLogger(__name__)
 current_agent = ContextVar('current_agent')
+# Name of the agent that called the one running in this context ('root' for the top-level agent).
+current_call_site: ContextVar[str] = ContextVar('current_call_site', default='root')
 current_toolbox: ContextVar[ToolBox | None] = ContextVar('current_toolbox', default=None)
+# Absolute event-loop time by which the current agent (and everything under it) must finish.
+current_deadline: ContextVar[float | None] = ContextVar('current_deadline', default=None)
 
 
 class Agent(TypedDict):
@@ -29,12 +46,256 @@ class Agent(TypedDict):
     prompt: str
     tools: list[str]
     kwargs: dict
+    max_input_tokens: NotRequired[int]
+    prompt_layout: NotRequired[str]
+    budget: NotRequired[dict[str, float]]
+    timeout: NotRequired[float]
+    tool_timeouts: NotRequired[dict[str, float]]
 
 
 def conclude():
     """Conclude the conversation."""
 
 
+def _compact(toolbox, agent: Agent, history: list[dict[str, Any]]) -> int:
+    """Apply the agent's max_input_tokens budget to history in place; returns tokens removed."""
+    if not (max_input_tokens := agent.get('max_input_tokens')):
+        return 0
+    reserved = count_tokens(agent.get('prompt', '')) + count_tokens(toolbox.get_tools(agent.get('tools', [])))
+    return compact_history(history, max_input_tokens, reserved)
+
+
+def _prompt_cache_key(agent: Agent, tools: list) -> str:
+    # Agents with the same model, prompt and tools share a prefix, so route them to the same cache.
+    prefix = json.dumps([agent.get('model'), agent.get('prompt', ''), tools], sort_keys=True, default=str)
+    return hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:32]
+
+
+def _build_request(toolbox, agent: Agent, history: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Layout 'suffix' (default) appends the system prompt after the history.
+    Layout 'prefix' puts it first so the system prompt, tool schemas and older
+    history form a byte-identical prefix across iterations and hit the prompt cache.
+    """
+    tools = toolbox.get_tools(agent.get('tools', []))
+    layout = agent.get('prompt_layout', 'suffix')
+    history_for_response = history
+    if prompt := agent.get('prompt'):
+        system = [{'role': 'system', 'content': prompt}]
+        history_for_response = system + history if layout == 'prefix' else history + system
+
+    request = {
+        'input': history_for_response,
+        'model': agent.get('model', 'gpt-5-mini'),
+        'tools': tools,
+        **agent.get('kwargs', {}),
+    }
+    if layout == 'prefix':
+        request.setdefault('prompt_cache_key', _prompt_cache_key(agent, tools))
+    return request
+
+
+def _deadline_for(seconds: float | None) -> float | None:
+    """The tighter of the inherited deadline and `seconds` from now."""
+    parent = current_deadline.get()
+    if not seconds:
+        return parent
+    deadline = asyncio.get_running_loop().time() + seconds
+    return deadline if parent is None else min(parent, deadline)
+
+
+def _check_deadline(agent: Agent) -> None:
+    deadline = current_deadline.get()
+    if deadline is not None and asyncio.get_running_loop().time() >= deadline:
+        raise TimeoutError(f"Agent {agent['name']} ran past its deadline")
+
+
+async def _run_tool_call(toolbox, agent: Agent, name: str, arguments: str, call_id: str | None = None):
+    checkpoint, path = current_checkpoint.get(), current_run_path.get()
+    if checkpoint and call_id and (output := checkpoint.output(path, call_id)) is not None:
+        # Finished before the run was interrupted; don't pay for it again.
+        return output
+    current_call_id.set(call_id)
+
+    deadline = _deadline_for((agent.get('tool_timeouts') or {}).get(name))
+    try:
+        async with asyncio.timeout_at(deadline):
+            result = await toolbox.run_tool(name, **json.loads(arguments))
+    except TimeoutError:
+        # This call's deadline, or a sub-agent's own, ran out. Report it to the model
+        # instead of failing the run; it can retry or move on. If the caller's
+        # deadline has passed too, its next request fails on _check_deadline.
+        logger.warning('Tool %s cancelled at its deadline', name)
+        result = f'Error: {name} did not finish before its deadline and was cancelled.'
+    if checkpoint and call_id:
+        checkpoint.save_output(path, call_id, result)
+    return result
+
+
+def _report_cancelled(names: list[str], reason: str) -> None:
+    if not names:
+        return
+    logger.warning('Cancelled %s after %s', names, reason)
+    if (span := current_span.get()) is not None:
+        span.attrs.setdefault('cancelled_tools', []).extend(names)
+
+
+async def _gather_tool_tasks(toolbox, names: list[str], tasks: list[asyncio.Task]) -> list:
+    """
+    Wait for one turn's tool tasks. If the turn calls conclude, sibling sub-agent
+    runs are cancelled since their answers can no longer be used; if any tool
+    fails, every sibling is cancelled before the error propagates.
+    """
+    if not tasks:
+        return []
+    if conclude.__name__ in names:
+        for name, task in zip(names, tasks):
+            if getattr(toolbox.get_tool_function(name), '__agent__', None) and not task.done():
+                task.cancel()
+
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    failed = next((t for t in done if not t.cancelled() and t.exception() is not None), None)
+    if failed is not None:
+        for task in pending:
+            task.cancel()
+        _report_cancelled([name for name, task in zip(names, tasks) if task in pending],
+                          f'{names[tasks.index(failed)]} failed')
+        raise failed.exception()
+
+    _report_cancelled([name for name, task in zip(names, tasks) if task.cancelled()], 'conclude')
+    return [
+        'Cancelled: the run concluded before this call finished.' if task.cancelled() else task.result()
+        for task in tasks
+    ]
+
+
+def _append_outputs(history: list, calls: list, results: list) -> None:
+    for item, result in zip(calls, results):
+        history.append({
+            'type': 'function_call_output',
+            'call_id': item.call_id,
+            'output': str(result),
+        })
+
+
+async def _run_tools(toolbox, agent: Agent, history: list, calls: list) -> bool:
+    """Run one turn's function calls and append their outputs; True if the turn called conclude."""
+    names = [item.name for item in calls]
+    tasks = [
+        asyncio.create_task(_run_tool_call(toolbox, agent, item.name, item.arguments, item.call_id))
+        for item in calls
+    ]
+    results = await _gather_tool_tasks(toolbox, names, tasks)
+    _append_outputs(history, calls, results)
+    return conclude.__name__ in names
+
+
+def _pending_calls(history: list) -> list[ResponseFunctionToolCall]:
+    """Function calls in a restored history that never got an output."""
+    answered = {item.get('call_id') for item in history if item.get('type') == 'function_call_output'}
+    return [
+        ResponseFunctionToolCall.model_validate(item)
+        for item in history
+        if item.get('type') == 'function_call' and item.get('call_id') not in answered
+    ]
+
+
+def _resume(agent: Agent, history: list) -> tuple[str | None, AgentState | None]:
+    """
+    This run's path in the checkpoint log, and its logged state if an interrupted
+    run is being resumed (history is then replaced with the logged one).
+    """
+    checkpoint = current_checkpoint.get()
+    if checkpoint is None:
+        return None, None
+    parent = current_run_path.get()
+    base = agent['name'] if parent is None else f"{parent}/{agent['name']}@{current_call_id.get()}"
+    path = checkpoint.claim(base)
+    return path, checkpoint.restore(path, history)
+
+
+def _save_step(history: list, request, response, reset: bool) -> None:
+    if (checkpoint := current_checkpoint.get()) is not None:
+        checkpoint.save_step(current_run_path.get(), history, request.get('model', response.model), response.usage, reset)
+
+
+def _finish(result: str | None) -> str | None:
+    if (checkpoint := current_checkpoint.get()) is not None:
+        checkpoint.save_result(current_run_path.get(), result)
+    return result
+
+
+def _record_usage(agent: Agent, request, response, usage, compacted: int, latency: float) -> None:
+    # Keyed by the requested model, which differs from the agent's after a budget downgrade.
+    model = request.get('model', response.model)
+    usage.append((model, response.usage))
+    if compacted:
+        usage.append((model, CompactionSavings(compacted)))
+    if (meter := current_meter.get()) is not None:
+        call_site = current_call_site.get()
+        meter.record(agent['name'], model, call_site, response.usage, latency)
+        if compacted:
+            meter.record_compaction(agent['name'], model, call_site, CompactionSavings(compacted))
+    if (budget := current_budget.get()) is not None:
+        budget.charge(agent['name'], model, response.usage)
+
+
+@contextmanager
+def _metered_tool_cache(toolbox):
+    """Add the memoized-tool hits and misses of this block to the current UsageMeter."""
+    before = toolbox.cache_stats()
+    try:
+        yield
+    finally:
+        if (meter := current_meter.get()) is not None:
+            for tool, stats in toolbox.cache_stats().items():
+                previous = before.get(tool, {'hits': 0, 'misses': 0})
+                meter.record_tool_cache(tool, stats['hits'] - previous['hits'], stats['misses'] - previous['misses'])
+
+
+class _ResponseChain:
+    """
+    Server-side conversation state: once a response id is known, only the items
+    appended since then are sent along with previous_response_id.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.previous_response_id: str | None = None
+        self.sent = 0
+
+    def apply(self, request: dict[str, Any], history: list[dict[str, Any]]) -> dict[str, Any]:
+        if self.previous_response_id:
+            request['input'] = history[self.sent:]
+            request['previous_response_id'] = self.previous_response_id
+        return request
+
+    def advance(self, response, history: list[dict[str, Any]]) -> None:
+        if self.enabled:
+            self.previous_response_id = response.id
+            self.sent = len(history)
+
+    def broken(self, exc: Exception) -> bool:
+        """Drop the chain after a rejected request; True if the caller should retry with full history."""
+        if not self.previous_response_id:
+            return False
+        logger.warning('Response chain %s rejected (%s); resending full history', self.previous_response_id, exc)
+        self.previous_response_id = None
+        return True
+
+
+def _enter_agent(agent: Agent) -> None:
+    caller = current_agent.get(None)
+    current_call_site.set(caller['name'] if caller else 'root')
+    current_agent.set(agent)
+
+
 async def run_agent(
     client,
     toolbox,
@@ -42,64 +303,188 @@ async def run_agent(
     user_message: str | None = None,
     history: list[dict[str, Any]] | None = None,
     usage: list[tuple[str, Any]] | None = None,
+    chained: bool = False,
 ) -> str | None:
-    current_agent.set(agent)
+    _enter_agent(agent)
 
     history = history if history is not None else []
     usage = usage if usage is not None else []
 
-    if user_message:
+    path, state = _resume(agent, history)
+    if user_message and state is None:
         history.append({'role': 'user', 'content': user_message})
 
-    while True:
-        history_for_response = history
-        if prompt := agent.get('prompt'):
-            history_for_response = history_for_response + [{'role': 'system', 'content': prompt}]
+    path_token = current_run_path.set(path)
+    deadline_token = current_deadline.set(_deadline_for(agent.get('timeout')))
+    try:
+        with trace_span(agent['name'], 'agent'):
+            return await _agent_loop(client, toolbox, agent, history, usage, chained, state)
+    finally:
+        current_deadline.reset(deadline_token)
+        current_run_path.reset(path_token)
 
+
+async def _agent_loop(
+    client,
+    toolbox,
+    agent: Agent,
+    history,
+    usage,
+    chained: bool,
+    state: AgentState | None = None,
+) -> str | None:
+    if state is not None:
+        if state.finished:
+            return state.result
+        if (pending := _pending_calls(history)) and await _run_tools(toolbox, agent, history, pending):
+            return _finish(None)
+
+    chain = _ResponseChain(chained and agent.get('kwargs', {}).get('store', True))
+    compacted = 0
+    budget_forced = False
+    while True:
+        removed = 0
+        if not chain.previous_response_id:
+            removed = _compact(toolbox, agent, history)
+            compacted += removed
+        _check_deadline(agent)
         start = time.time()
         logger.debug('AGENT %s', agent['name'])
-        response = await client.responses.create(
-            input=history_for_response,
-            model=agent.get('model', 'gpt-5-mini'),
-            tools=toolbox.get_tools(agent.get('tools', [])),
-            **agent.get('kwargs', {}),
-        )
-        logger.debug('RESPONSE from %s in %.2f seconds', agent['name'], time.time() - start)
-
-        usage.append((agent.get('model', response.model), response.usage))
+        try:
+            request = chain.apply(_build_request(toolbox, agent, history), history)
+            if (budget := current_budget.get()) is not None:
+                budget_forced = budget.gate(agent, request, budget_forced)
+            with trace_span('responses.create', 'llm') as span:
+                async with asyncio.timeout_at(current_deadline.get()):
+                    response = await client.responses.create(**request)
+                record_response(span, request, response)
+        except (BadRequestError, NotFoundError) as exc:
+            if chain.broken(exc):
+                continue
+            raise
+        latency = time.time() - start
+        logger.debug('RESPONSE from %s in %.2f seconds', agent['name'], latency)
+
+        _record_usage(agent, request, response, usage, compacted, latency)
         history.extend(response.output)
+        chain.advance(response, history)
+        _save_step(history, request, response, reset=removed > 0)
 
         outputs = [item for item in response.output if item.type == 'message']
         if outputs:
-            return '\n'.join(
+            return _finish('\n'.join(
                 chunk.text
                 for item in outputs
                 for chunk in item.content
-            )
+            ))
 
-        tool_calls = {
-            item.call_id: toolbox.run_tool(item.name, **json.loads(item.arguments))
-            for item in response.output
-            if item.type == 'function_call'
-        }
+        tool_calls = [item for item in response.output if item.type == 'function_call']
+        if await _run_tools(toolbox, agent, history, tool_calls):
+            return _finish(None)
 
-        results = await asyncio.gather(*(asyncio.create_task(call) for call in tool_calls.values()))
 
-        for call_id, result in zip(tool_calls.keys(), results):
-            history.append({
-                'type': 'function_call_output',
-                'call_id': call_id,
-                'output': str(result),
-            })
+async def stream_agent(
+    client,
+    toolbox,
+    agent: Agent,
+    user_message: str | None = None,
+    history: list[dict[str, Any]] | None = None,
+    usage: list[tuple[str, Any]] | None = None,
+    chained: bool = False,
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of run_agent: yields text deltas as they arrive and starts
+    each tool call as soon as its function_call item is done, while the model is
+    still generating the rest of the turn. With `chained`, follow-up requests
+    send only new items plus previous_response_id.
+    """
+    _enter_agent(agent)
 
-        if any(
-            item.type == 'function_call' and item.name == conclude.__name__
-            for item in response.output
-        ):
-            return None
+    history = history if history is not None else []
+    usage = usage if usage is not None else []
 
+    path, state = _resume(agent, history)
+    if user_message and state is None:
+        history.append({'role': 'user', 'content': user_message})
 
-def as_tool(client, toolbox, agent, history=None, usage=None):
+    # A generator can be closed from another context, so these are set without a reset, like current_agent.
+    current_run_path.set(path)
+    current_deadline.set(_deadline_for(agent.get('timeout')))
+
+    with trace_span(agent['name'], 'agent'):
+        if state is not None:
+            if state.finished:
+                if state.result:
+                    yield state.result
+                return
+            if (pending := _pending_calls(history)) and await _run_tools(toolbox, agent, history, pending):
+                _finish(None)
+                return
+
+        chain = _ResponseChain(chained and agent.get('kwargs', {}).get('store', True))
+        compacted = 0
+        budget_forced = False
+        while True:
+            removed = 0
+            if not chain.previous_response_id:
+                removed = _compact(toolbox, agent, history)
+                compacted += removed
+            _check_deadline(agent)
+            start = time.time()
+            logger.debug('AGENT %s', agent['name'])
+            tool_calls: list = []
+            tool_tasks: list[asyncio.Task] = []
+
+            try:
+                request = chain.apply(_build_request(toolbox, agent, history), history)
+                if (budget := current_budget.get()) is not None:
+                    budget_forced = budget.gate(agent, request, budget_forced)
+                with trace_span('responses.stream', 'llm') as span:
+                    async with client.responses.stream(**request) as stream:
+                        async for event in stream:
+                            if event.type == 'response.output_text.delta':
+                                yield event.delta
+                            elif event.type == 'response.output_item.done' and event.item.type == 'function_call':
+                                item = event.item
+                                tool_calls.append(item)
+                                tool_tasks.append(asyncio.create_task(
+                                    _run_tool_call(toolbox, agent, item.name, item.arguments, item.call_id)
+                                ))
+                        response = await stream.get_final_response()
+                    record_response(span, request, response)
+            except (BadRequestError, NotFoundError) as exc:
+                # Rejected before any output, so no tool task has started yet.
+                if chain.broken(exc):
+                    continue
+                raise
+            except BaseException:
+                for task in tool_tasks:
+                    task.cancel()
+                raise
+            latency = time.time() - start
+            logger.debug('RESPONSE from %s in %.2f seconds', agent['name'], latency)
+
+            _record_usage(agent, request, response, usage, compacted, latency)
+            history.extend(response.output)
+            chain.advance(response, history)
+            _save_step(history, request, response, reset=removed > 0)
+
+            if messages := [item for item in response.output if item.type == 'message']:
+                # run_agent ignores tool calls on a turn that produced a message; match that.
+                for task in tool_tasks:
+                    task.cancel()
+                _finish('\n'.join(chunk.text for item in messages for chunk in item.content))
+                return
+
+            results = await _gather_tool_tasks(toolbox, [item.name for item in tool_calls], tool_tasks)
+            _append_outputs(history, tool_calls, results)
+
+            if any(item.name == conclude.__name__ for item in tool_calls):
+                _finish(None)
+                return
+
+
+def as_tool(client, toolbox, agent, history=None, usage=None, chained=False):
     async def function(input: str) -> str:
         return await run_agent(
             client,
@@ -108,13 +493,87 @@ def as_tool(client, toolbox, agent, history=None, usage=None):
             user_message=input,
             history=history,
             usage=usage,
+            chained=chained,
         )
 
     function.__name__ = agent['name']
     function.__doc__ = agent.get('description', '')
+    function.__agent__ = agent
     return function
 
 
+@dataclass
+class MapResult:
+    index: int
+    input: str
+    ok: bool
+    output: str | None = None
+    error: str | None = None
+
+
+async def bounded_map(
+    fn: Callable[[str], Awaitable[str | None]],
+    inputs: Iterable[str],
+    concurrency: int = 4,
+    timeout: float | None = None,
+    ordered: bool = True,
+) -> AsyncIterator[MapResult]:
+    """
+    Run fn over inputs with at most `concurrency` calls in flight.
+    Yields one MapResult per input as soon as it is available (or in input
+    order when `ordered`); failures and timeouts are reported, not raised.
+    """
+    items = list(enumerate(inputs))
+    pending = iter(items)
+    done: asyncio.Queue[MapResult] = asyncio.Queue()
+
+    async def worker():
+        for index, item in pending:
+            try:
+                output = await asyncio.wait_for(fn(item), timeout)
+                result = MapResult(index, item, ok=True, output=output)
+            except asyncio.TimeoutError:
+                result = MapResult(index, item, ok=False, error=f'Timed out after {timeout}s')
+            except Exception as exc:
+                result = MapResult(index, item, ok=False, error=f'{type(exc).__name__}: {exc}')
+            done.put_nowait(result)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(items))))]
+    try:
+        buffered: dict[int, MapResult] = {}
+        next_index = 0
+        for _ in items:
+            result = await done.get()
+            if not ordered:
+                yield result
+                continue
+            buffered[result.index] = result
+            while next_index in buffered:
+                yield buffered.pop(next_index)
+                next_index += 1
+    finally:
+        for task in workers:
+            task.cancel()
+
+
+async def map_agent(
+    client,
+    toolbox,
+    agent: Agent,
+    inputs: Iterable[str],
+    concurrency: int = 4,
+    timeout: float | None = None,
+    ordered: bool = True,
+    usage: list[tuple[str, Any]] | None = None,
+) -> AsyncIterator[MapResult]:
+    """Run one agent definition over many inputs, each with a fresh history."""
+    async def run_one(item: str) -> str | None:
+        return await run_agent(client, toolbox, agent, user_message=item, usage=usage)
+
+    async for result in bounded_map(run_one, inputs, concurrency, timeout, ordered):
+        yield result
+
+
 def _normalize_tools(tools: Iterable[Callable] | dict[str, Callable] | None) -> dict[str, Callable]:
     if tools is None:
         return {}
@@ -159,6 +618,11 @@ async def run_pluggable_agent(
     tool_functions: Iterable[Callable] | dict[str, Callable] | None = None,
     client: AsyncOpenAI | None = None,
     usage: list[tuple[str, Any]] | None = None,
+    on_delta: Callable[[str], None] | None = None,
+    chained: bool = False,
+    prompt_layout: str | None = None,
+    budget: Budget | None = None,
+    checkpoint: Checkpoint | None = None,
 ) -> str | None:
     """
     Plug-and-play agent runner:
@@ -167,32 +631,41 @@ async def run_pluggable_agent(
     - Registers provided Python callables as tools.
     - Supports kwargs and kwarks (alias).
     - If a usage list is passed, usage is appended to it in place.
+    - If on_delta is passed, the main agent is streamed and on_delta receives each text delta.
+    - If chained is set, every agent sends only new items plus previous_response_id after its first call.
+    - prompt_layout ('prefix' or 'suffix') applies to agents that do not set their own.
+    - A YAML graph is compiled (and validated) once per file contents; see agent_graph.load_agent_graph.
+    - If a budget is passed, every response is charged to it and its ceilings are enforced.
+    - If a checkpoint is passed, every agent logs each step to it; a checkpoint that already
+      holds an interrupted run is resumed, reusing its message, responses and tool outputs.
     """
     local_client = client or AsyncOpenAI()
     usage = usage if usage is not None else []
 
-    toolbox = ToolBox()
-    toolbox.tool(conclude)
-
-    for fn in _normalize_tools(tool_functions).values():
-        toolbox.tool(fn)
+    if checkpoint is not None:
+        checkpoint.start(message=message)
+        message = checkpoint.meta.get('message', message)
+        # Work done before the interruption still counts toward this run's usage, meter and budget.
+        meter = current_meter.get()
+        for path, model, logged in checkpoint.usage():
+            usage.append((model, logged))
+            agent_name, call_site = path_agents(path)
+            if meter is not None:
+                meter.record_restored(agent_name, model, call_site, logged)
+            if budget is not None:
+                budget.charge(agent_name, model, logged)
 
     if yaml_path:
-        raw = Path(yaml_path).read_text(encoding='utf-8')
-        docs = [doc for doc in yaml.safe_load_all(raw) if doc]
-        if not docs:
-            raise ValueError('YAML file has no agent definitions.')
-
-        agents: list[Agent] = docs
-        for ag in agents:
-            if ag.get('name') != main_agent_name:
-                toolbox.tool(as_tool(local_client, toolbox, ag, usage=usage))
-
-        try:
-            main_agent = next(a for a in agents if a.get('name') == main_agent_name)
-        except StopIteration as exc:
-            raise ValueError(f"No main agent named '{main_agent_name}' found in YAML.") from exc
+        # agent_graph imports this module, so it is imported here rather than at the top.
+        from agent_graph import load_agent_graph
+        graph = load_agent_graph(yaml_path, tool_functions, main_agent_name, prompt_layout)
+        toolbox = graph.build_toolbox(local_client, usage=usage, chained=chained)
+        main_agent = graph.main
     else:
+        toolbox = ToolBox()
+        toolbox.tool(conclude)
+        for fn in _normalize_tools(tool_functions).values():
+            toolbox.tool(fn)
         main_agent = _build_agent(
             name=name,
             description=description,
@@ -202,21 +675,52 @@ async def run_pluggable_agent(
             kwargs=kwargs,
             kwarks=kwarks,
         )
+        if prompt_layout:
+            main_agent['prompt_layout'] = prompt_layout
 
     token = current_toolbox.set(toolbox)
+    budget_token = current_budget.set(budget)
+    checkpoint_token = current_checkpoint.set(checkpoint)
+    # run_agent and stream_agent set these without resetting them; scope them to this run.
+    agent_token = current_agent.set(None)
+    path_token = current_run_path.set(None)
+    deadline_token = current_deadline.set(current_deadline.get())
     try:
-        response = await run_agent(
-            local_client,
-            toolbox,
-            main_agent,
-            user_message=message,
-            usage=usage,
-        )
+        with _metered_tool_cache(toolbox):
+            if on_delta is None:
+                response = await run_agent(
+                    local_client,
+                    toolbox,
+                    main_agent,
+                    user_message=message,
+                    usage=usage,
+                    chained=chained,
+                )
+            else:
+                chunks: list[str] = []
+                async for delta in stream_agent(
+                    local_client,
+                    toolbox,
+                    main_agent,
+                    user_message=message,
+                    usage=usage,
+                    chained=chained,
+                ):
+                    on_delta(delta)
+                    chunks.append(delta)
+                response = ''.join(chunks) or None
     finally:
+        current_deadline.reset(deadline_token)
+        current_run_path.reset(path_token)
+        current_agent.reset(agent_token)
+        current_checkpoint.reset(checkpoint_token)
+        current_budget.reset(budget_token)
         current_toolbox.reset(token)
+        toolbox.shutdown()
     return response
 
 
+@execution('thread', max_concurrency=1)
 def talk_to_user(message: str) -> str:
     """
     Use this function to communicate with the user.
@@ -231,6 +735,19 @@ def talk_to_user(message: str) -> str:
     return input('User: ')
 
 
+def _unattended_talk_to_user(message: str) -> str:
+    """
+    Use this function to communicate with the user.
+    :param message: The message to send to the user.
+    :return: The user's response.
+    """
+    # Batch items and service requests have nobody at a terminal to answer.
+    return 'No user is available to answer. Proceed with reasonable assumptions.'
+
+
+_unattended_talk_to_user.__name__ = 'talk_to_user'
+
+
 def _resolve_within_workspace(path: Path) -> Path | None:
     base_dir = Path.cwd().resolve()
     try:
@@ -239,6 +756,34 @@ def _resolve_within_workspace(path: Path) -> Path | None:
         return None
 
 
+def _file_version(file_path: str):
+    # Memo key for read_file: a cached read is reused only while the file is unchanged.
+    path = Path(file_path).expanduser().resolve()
+    try:
+        stat = path.stat()
+    except OSError:
+        return str(path), None
+    return str(path), stat.st_mtime_ns, stat.st_size
+
+
+@memoize(max_entries=256, key=_file_version)
+@execution('thread')
+def read_file(file_path: str) -> str:
+    """
+    Read a text file from the workspace.
+    :param file_path: Path of the file, relative to the workspace.
+    :return: The file contents, or an error message.
+    """
+    target = Path(file_path).expanduser().resolve()
+    if _resolve_within_workspace(target) is None:
+        return f'Error: {file_path} is outside the workspace.'
+    try:
+        return target.read_text(encoding='utf-8')
+    except (OSError, UnicodeDecodeError) as exc:
+        return f'Error: could not read {file_path}: {exc}'
+
+
+@execution('thread')
 def run_terminal(file_text: str, file_name: str, file_path: str) -> str:
     """
     Write a document to disk.
@@ -279,6 +824,7 @@ def run_terminal(file_text: str, file_name: str, file_path: str) -> str:
     })
 
 
+@execution('thread')
 def write_files(files_json: str) -> str:
     """
     Write one or more files from a JSON payload.
@@ -330,37 +876,133 @@ def write_files(files_json: str) -> str:
     return json.dumps({'status': status, 'written_files': written_files, 'notes': notes})
 
 
-def python(code: str) -> str:
+async def python(code: str) -> str:
     """
     Execute Python code with the current interpreter and return stdout/stderr + exit code.
     :param code: Python code to execute.
     :return: Combined command output.
     """
-    completed = subprocess.run(
-        [sys.executable, '-c', code],
-        capture_output=True,
-        text=True,
+    # A child process rather than a worker thread, so a tool deadline or a cancelled
+    # sibling call kills the code instead of leaving a thread waiting on it.
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, '-c', code,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
     )
+    try:
+        stdout, stderr = await process.communicate()
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await asyncio.shield(process.wait())
+        raise
     output: list[str] = []
-    if completed.stdout:
-        output.append(completed.stdout.strip())
-    if completed.stderr:
-        output.append(completed.stderr.strip())
-    output.append(f'exit_code={completed.returncode}')
+    if stdout:
+        output.append(stdout.decode(errors='replace').strip())
+    if stderr:
+        output.append(stderr.decode(errors='replace').strip())
+    output.append(f'exit_code={process.returncode}')
     return '\n'.join(part for part in output if part)
 
 
+@execution('thread')
 def terminal_writer(file_text: str, file_name: str, file_path: str) -> str:
     """Alias tool for writing a document to disk."""
     return run_terminal(file_text, file_name, file_path)
 
 
+# ${step} or ${step.field.0} inside run_parallel_tools args: an earlier step's output (or a field of its JSON).
+# Only ids a call declares with "id" are references; any other ${...} (shell, JS templates) is left as text.
+_STEP_REF = re.compile(r'\$\{([A-Za-z0-9_-]+)((?:\.[A-Za-z0-9_-]+)*)\}')
+
+
+def _step_refs(value: Any, declared: set[str]) -> set[str]:
+    if isinstance(value, str):
+        return {match[1] for match in _STEP_REF.finditer(value) if match[1] in declared}
+    if isinstance(value, dict):
+        return set().union(*(_step_refs(v, declared) for v in value.values()))
+    if isinstance(value, list):
+        return set().union(*(_step_refs(v, declared) for v in value))
+    return set()
+
+
+def _resolve_step_ref(output: str, path: str) -> Any:
+    if not path:
+        return output
+    value = json.loads(output)
+    for key in path[1:].split('.'):
+        value = value[int(key)] if isinstance(value, list) else value[key]
+    return value
+
+
+def _substitute_refs(value: Any, outputs: dict[str, str], declared: set[str]) -> Any:
+    if isinstance(value, str):
+        if (match := _STEP_REF.fullmatch(value)) and match[1] in declared:
+            # A bare reference keeps the referenced JSON value's type.
+            return _resolve_step_ref(outputs[match[1]], match[2])
+        return _STEP_REF.sub(
+            lambda m: _as_text(_resolve_step_ref(outputs[m[1]], m[2])) if m[1] in declared else m[0],
+            value,
+        )
+    if isinstance(value, dict):
+        return {k: _substitute_refs(v, outputs, declared) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_substitute_refs(v, outputs, declared) for v in value]
+    return value
+
+
+def _as_text(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _plan_steps(calls: list[Any]) -> tuple[list[str], set[str], dict[str, set[str]]]:
+    """
+    Step ids (a call's "id", else its index), the ids declared with "id", and each
+    step's dependencies; raises ValueError on a bad graph.
+    """
+    ids = [str(call.get('id', i)) if isinstance(call, dict) else str(i) for i, call in enumerate(calls)]
+    if len(set(ids)) != len(ids):
+        raise ValueError('Step ids must be unique.')
+    declared = {str(call['id']) for call in calls if isinstance(call, dict) and 'id' in call}
+    deps: dict[str, set[str]] = {}
+    for step_id, call in zip(ids, calls):
+        if not isinstance(call, dict):
+            deps[step_id] = set()
+            continue
+        after = call.get('after', [])
+        after = {str(a) for a in (after if isinstance(after, list) else [after])}
+        deps[step_id] = _step_refs(call.get('args', {}), declared) | after
+        if unknown := deps[step_id] - set(ids):
+            raise ValueError(f'Step {step_id} depends on unknown steps: {sorted(unknown)}')
+
+    # Kahn's algorithm: anything left unvisited is on a cycle.
+    remaining = {step_id: set(d) for step_id, d in deps.items()}
+    ready = [step_id for step_id, d in remaining.items() if not d]
+    while ready:
+        done = ready.pop()
+        for step_id, d in remaining.items():
+            if done in d:
+                d.discard(done)
+                if not d:
+                    ready.append(step_id)
+        remaining.pop(done)
+    if remaining:
+        raise ValueError(f'Steps form a cycle: {sorted(remaining)}')
+    return ids, declared, deps
+
+
 async def run_parallel_tools(calls_json: str) -> str:
     """
-    Run multiple tool calls concurrently.
+    Run multiple tool calls concurrently, optionally as a dependency graph.
     Input JSON format:
       [{"tool": "tool_name", "args": {"k": "v"}}, ...]
-    Returns JSON with one result object per call.
+    Give a call an "id" and later calls can use its output in their args as
+    "${id}" (or "${id.field}" when the output is JSON); they wait for it, and
+    "after": ["id", ...] adds ordering without using the output (calls without
+    an "id" can be named there by index). Any other ${...} text is passed through
+    unchanged. Independent steps run at the same time, so a whole plan needs one
+    tool turn.
+    Returns JSON with one result object per call, in input order.
     """
     toolbox = current_toolbox.get(None)
     if toolbox is None:
@@ -374,23 +1016,106 @@ async def run_parallel_tools(calls_json: str) -> str:
     if not isinstance(calls, list):
         return json.dumps({'error': 'calls_json must decode to a list.'})
 
-    async def _execute(call: dict[str, Any]) -> dict[str, Any]:
+    try:
+        ids, declared, deps = _plan_steps(calls)
+    except ValueError as exc:
+        return json.dumps({'error': str(exc)})
+
+    outputs: dict[str, str] = {}
+
+    async def _execute(step_id: str, call: Any, after: list[asyncio.Task]) -> dict[str, Any]:
+        if not isinstance(call, dict):
+            return {'id': step_id, 'tool': None, 'ok': False, 'error': 'Each call must be an object.'}
         tool_name = call.get('tool')
         args = call.get('args', {})
         if not isinstance(tool_name, str):
-            return {'tool': tool_name, 'ok': False, 'error': "Missing or invalid 'tool' name."}
+            return {'id': step_id, 'tool': tool_name, 'ok': False, 'error': "Missing or invalid 'tool' name."}
         if tool_name == 'run_parallel_tools':
-            return {'tool': tool_name, 'ok': False, 'error': 'Nested run_parallel_tools is not allowed.'}
+            return {'id': step_id, 'tool': tool_name, 'ok': False, 'error': 'Nested run_parallel_tools is not allowed.'}
         if not isinstance(args, dict):
-            return {'tool': tool_name, 'ok': False, 'error': "'args' must be an object."}
+            return {'id': step_id, 'tool': tool_name, 'ok': False, 'error': "'args' must be an object."}
+        failed = [r['id'] for r in await asyncio.gather(*after) if not r['ok']]
+        if failed:
+            return {'id': step_id, 'tool': tool_name, 'ok': False, 'error': f'Skipped: {failed} failed.'}
         try:
-            result = await toolbox.run_tool(tool_name, **args)
-            return {'tool': tool_name, 'ok': True, 'result': str(result)}
+            result = str(await toolbox.run_tool(tool_name, **_substitute_refs(args, outputs, declared)))
         except Exception as exc:
-            return {'tool': tool_name, 'ok': False, 'error': str(exc)}
+            return {'id': step_id, 'tool': tool_name, 'ok': False, 'error': str(exc)}
+        outputs[step_id] = result
+        return {'id': step_id, 'tool': tool_name, 'ok': True, 'result': result}
+
+    # Creating tasks in dependency order means every step's prerequisites already exist.
+    tasks: dict[str, asyncio.Task] = {}
+    pending = dict(zip(ids, calls))
+    while pending:
+        for step_id, call in list(pending.items()):
+            if deps[step_id] <= tasks.keys():
+                after = [tasks[d] for d in deps[step_id]]
+                tasks[step_id] = asyncio.create_task(_execute(step_id, call, after))
+                del pending[step_id]
 
-    results = await asyncio.gather(*(_execute(call) for call in calls))
-    return json.dumps({'results': results})
+    try:
+        results = await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+    by_id = {result['id']: result for result in results}
+    return json.dumps({'results': [by_id[step_id] for step_id in ids]})
+
+
+async def run_agent_map(agent_name: str, inputs_json: str, max_concurrency: int, timeout_seconds: float) -> str:
+    """
+    Run one agent over many inputs with bounded concurrency.
+    :param agent_name: Name of the agent tool to call for each input.
+    :param inputs_json: JSON array of input strings, one agent run per entry.
+    :param max_concurrency: Maximum number of agent runs in flight at once.
+    :param timeout_seconds: Per-input timeout in seconds; 0 means no timeout.
+    :return: JSON with one result per input (in input order) plus a failure count.
+    """
+    toolbox = current_toolbox.get(None)
+    if toolbox is None:
+        return json.dumps({'error': 'No active toolbox in context.'})
+    if agent_name in ('run_agent_map', 'run_parallel_tools'):
+        return json.dumps({'error': f'{agent_name} cannot be mapped.'})
+    if not getattr(toolbox.get_tool_function(agent_name), '__agent__', None):
+        return json.dumps({'error': f"Unknown agent '{agent_name}'"})
+
+    try:
+        inputs = json.loads(inputs_json)
+    except json.JSONDecodeError as exc:
+        return json.dumps({'error': f'Invalid JSON: {exc}'})
+    if not isinstance(inputs, list):
+        return json.dumps({'error': 'inputs_json must decode to a list.'})
+
+    async def call(item: str) -> str:
+        return str(await toolbox.run_tool(agent_name, input=item))
+
+    results = [
+        asdict(result)
+        async for result in bounded_map(
+            call,
+            [item if isinstance(item, str) else json.dumps(item) for item in inputs],
+            concurrency=max_concurrency,
+            timeout=timeout_seconds or None,
+        )
+    ]
+    return json.dumps({'results': results, 'failed': sum(not r['ok'] for r in results)})
+
+
+def check_budget() -> str:
+    """
+    Report how many tokens and dollars this run and the calling agent have spent so far.
+    :return: JSON with total and per-agent spend and the run's limits.
+    """
+    budget = current_budget.get()
+    if budget is None:
+        return json.dumps({'error': 'No budget is being tracked for this run.'})
+    agent = current_agent.get(None)
+    snapshot = budget.snapshot(agent['name'] if agent else None)
+    if agent:
+        snapshot['used_fraction'] = round(budget.used(agent), 4)
+    return json.dumps(snapshot)
 
 
 def _load_yaml_docs(yaml_path: Path) -> list[dict[str, Any]]:
@@ -426,52 +1151,193 @@ def _configure_debug_logging() -> None:
         log.propagate = False
 
 
-def _select_runtime_tools(docs: list[dict[str, Any]]) -> list[Callable]:
-    runtime_tools: list[Callable] = [talk_to_user]
+def _select_runtime_tools(docs: list[dict[str, Any]], interactive: bool = True) -> list[Callable]:
+    runtime_tools: list[Callable] = [talk_to_user if interactive else _unattended_talk_to_user]
     if _yaml_uses_tool(docs, 'python'):
         runtime_tools.append(python)
     if _yaml_uses_tool(docs, 'run_terminal'):
         runtime_tools.append(run_terminal)
+    if _yaml_uses_tool(docs, 'read_file'):
+        runtime_tools.append(read_file)
     if _yaml_uses_tool(docs, 'write_files'):
         runtime_tools.append(write_files)
     if _yaml_uses_tool(docs, 'run_parallel_tools'):
         runtime_tools.append(run_parallel_tools)
+    if _yaml_uses_tool(docs, 'run_agent_map'):
+        runtime_tools.append(run_agent_map)
+    if _yaml_uses_tool(docs, 'check_budget'):
+        runtime_tools.append(check_budget)
     if _yaml_uses_tool(docs, 'terminal_writer') and not _yaml_has_agent_name(docs, 'terminal_writer'):
         runtime_tools.append(terminal_writer)
     return runtime_tools
 
 
-async def main(yaml_path: Path, message: str | None, debug: bool = False) -> None:
+def _build_client(
+    cache_mode: str = 'passthrough',
+    cache_dir: Path | None = None,
+    limiter: RateLimiter | None = None,
+    max_connections: int | None = None,
+):
+    # Replay never reaches the API, so it should not require a real key.
+    api_key = os.environ.get('OPENAI_API_KEY') or ('replay' if cache_mode == 'replay' else None)
+    http_client = None
+    if max_connections:
+        # Same Limits type the SDK uses for its default pool, sized for a long-lived process.
+        limits = type(DEFAULT_CONNECTION_LIMITS)(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=DEFAULT_CONNECTION_LIMITS.keepalive_expiry,
+        )
+        http_client = DefaultAsyncHttpxClient(limits=limits)
+    client = AsyncOpenAI(api_key=api_key, http_client=http_client)
+    if limiter is not None:
+        client = RateLimitedClient(client, limiter)
+    if cache_mode != 'passthrough':
+        # Cache outermost so hits never wait on the rate limiter.
+        client = CachedClient(client, ResponseCache(cache_dir or Path('.response_cache'), mode=cache_mode))
+    return client
+
+
+async def main(
+    yaml_path: Path,
+    message: str | None,
+    debug: bool = False,
+    cache_mode: str = 'passthrough',
+    cache_dir: Path | None = None,
+    stream: bool = False,
+    rate_limits: Path | None = None,
+    chained: bool = False,
+    prompt_layout: str | None = None,
+    trace_jsonl: Path | None = None,
+    trace_chrome: Path | None = None,
+    max_tokens: int | None = None,
+    max_usd: float | None = None,
+    checkpoint_dir: Path | None = None,
+    resume: str | None = None,
+    metrics_json: Path | None = None,
+    metrics_prom: Path | None = None,
+) -> None:
     if debug:
         _configure_debug_logging()
+    tracer = Tracer() if trace_jsonl or trace_chrome else None
+    current_tracer.set(tracer)
+    meter = UsageMeter()
+    current_meter.set(meter)
     usages: list[tuple[str, Any]] = []
     docs = _load_yaml_docs(yaml_path)
+    # Off unless a limits file is given; the built-in limits are conservative tier-1 values.
+    limiter = RateLimiter(load_limits(rate_limits)) if rate_limits else None
+    client = _build_client(cache_mode, cache_dir, limiter)
+    budget = Budget(Limits(max_tokens, max_usd) if max_tokens or max_usd else None)
+    checkpoint = Checkpoint.open(checkpoint_dir, resume) if checkpoint_dir else None
+    if checkpoint is not None:
+        print(f'Run {checkpoint.run_id} (continue after a crash with '
+              f'--checkpoint-dir {checkpoint_dir} --resume {checkpoint.run_id})', file=sys.stderr)
 
     try:
         response = await run_pluggable_agent(
             yaml_path=yaml_path,
             message=message or '',
             tool_functions=_select_runtime_tools(docs),
+            client=client,
             usage=usages,
+            on_delta=(lambda delta: print(delta, end='', flush=True)) if stream else None,
+            chained=chained,
+            prompt_layout=prompt_layout,
+            budget=budget,
+            checkpoint=checkpoint,
         )
         if response:
-            print(response)
+            if not stream:
+                print(response)
             print()
     finally:
+        if checkpoint is not None:
+            checkpoint.close()
         print_usage(usages)
+        print_usage_by_agent(meter)
+        if limiter is not None:
+            print_rate_limit_metrics(limiter)
+        print_tool_cache(meter)
+        print_budget(budget)
+        if tracer and trace_jsonl:
+            tracer.export_jsonl(trace_jsonl)
+        if tracer and trace_chrome:
+            tracer.export_chrome(trace_chrome)
+        if metrics_json:
+            meter.write_json(metrics_json)
+        if metrics_prom:
+            meter.write_prometheus(metrics_prom)
 
 
 def cli() -> None:
-    parser = argparse.ArgumentParser(description='Run an agent from a YAML file.')
+    if sys.argv[1:2] == ['batch']:
+        from batch import cli as batch_cli
+        batch_cli(sys.argv[2:])
+        return
+    parser = argparse.ArgumentParser(
+        description='Run an agent from a YAML file.',
+        epilog="Use 'run_agent.py batch --help' to run many messages from a JSONL file.",
+    )
     parser.add_argument('yaml_path', type=Path, help='Path to the agent YAML file.')
     parser.add_argument('message', nargs='?', default=None, help='Initial message to the agent.')
     parser.add_argument('--debug', action='store_true', help='Enable debug logging.')
+    parser.add_argument(
+        '--cache-mode',
+        choices=CACHE_MODES,
+        default='passthrough',
+        help='record: reuse cached responses and store new ones; replay: cached responses only; passthrough: no cache.',
+    )
+    parser.add_argument('--cache-dir', type=Path, default=None, help='Response cache directory (default: .response_cache).')
+    parser.add_argument('--stream', action='store_true', help='Stream the main agent and start tools as soon as each call is complete.')
+    parser.add_argument('--rate-limits', type=Path, default=None, help='Schedule requests through per-model RPM/TPM buckets from this YAML mapping of model -> {rpm, tpm} (off by default).')
+    parser.add_argument('--chain', action='store_true', help='Chain requests with previous_response_id instead of resending history.')
+    parser.add_argument(
+        '--prompt-layout',
+        choices=('prefix', 'suffix'),
+        default=None,
+        help='Where to put system prompts for agents that do not set prompt_layout; prefix maximizes prompt-cache hits.',
+    )
+    parser.add_argument('--trace-jsonl', type=Path, default=None, help='Write one JSON span per line for every LLM call, tool call and agent run.')
+    parser.add_argument('--trace-chrome', type=Path, default=None, help='Write spans as Chrome trace-event JSON for a flamegraph viewer.')
+    parser.add_argument('--max-tokens', type=int, default=None, help='Token ceiling for the whole run; agents downgrade near it and conclude at it.')
+    parser.add_argument('--max-usd', type=float, default=None, help='USD ceiling for the whole run, priced from usage.PRICING.')
+    parser.add_argument('--checkpoint-dir', type=Path, default=None, help='Log every step to a checkpoint in this directory so the run can be resumed (off by default).')
+    parser.add_argument('--resume', metavar='RUN_ID', default=None, help='Continue an interrupted run from its checkpoint log in --checkpoint-dir.')
+    parser.add_argument('--metrics-json', type=Path, default=None, help='Write per-agent usage, cost and latency as JSON.')
+    parser.add_argument('--metrics-prom', type=Path, default=None, help='Write per-agent usage, cost and latency in Prometheus text format.')
     args = parser.parse_args()
+    if args.resume and not args.checkpoint_dir:
+        parser.error('--resume needs the --checkpoint-dir the run was logged to')
+    if args.resume and not (args.checkpoint_dir / f'{args.resume}.jsonl').exists():
+        parser.error(f'No checkpoint found for run {args.resume}')
     try:
-        asyncio.run(main(args.yaml_path, args.message, args.debug))
+        asyncio.run(main(
+            args.yaml_path,
+            args.message,
+            args.debug,
+            args.cache_mode,
+            args.cache_dir,
+            args.stream,
+            args.rate_limits,
+            args.chain,
+            args.prompt_layout,
+            args.trace_jsonl,
+            args.trace_chrome,
+            args.max_tokens,
+            args.max_usd,
+            args.checkpoint_dir,
+            args.resume,
+            args.metrics_json,
+            args.metrics_prom,
+        ))
     except KeyboardInterrupt:
         pass
 
 
 if __name__ == '__main__':
-    cli()
+    # agent_graph (and the tools it builds) import `run_agent`, which would be a second
+    # copy of this script with its own ContextVars. Run the CLI from that importable
+    # module instead so the whole run shares one copy, as run_as_agent.py does.
+    from run_agent import cli as _cli
+    _cli()
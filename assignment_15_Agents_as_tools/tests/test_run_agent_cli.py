@@ -0,0 +1,49 @@
+import builtins
+import json
+import runpy
+import sys
+from pathlib import Path
+
+import openai
+
+import run_agent
+from fake_client import FakeAsyncOpenAI, function_call, message, scripted
+
+RUN_AGENT = Path(run_agent.__file__)
+
+GRAPH = """\
+name: main
+model: gpt-5-mini
+prompt: Delegate to the helper.
+tools: [helper]
+---
+name: helper
+description: Says hi to the user.
+model: gpt-5-mini
+prompt: Say hi.
+tools: [talk_to_user]
+"""
+
+
+def test_cli_sub_agent_keeps_name_and_call_site(tmp_path, monkeypatch, capsys):
+    yaml_path = tmp_path / 'graph.yaml'
+    yaml_path.write_text(GRAPH)
+    metrics = tmp_path / 'metrics.json'
+    fake = FakeAsyncOpenAI(scripted([
+        [function_call('helper', {'input': 'greet'})],
+        [function_call('talk_to_user', {'message': 'hi from helper'})],
+        [message('greeted')],
+        [message('done')],
+    ]))
+    for module in (openai, run_agent):
+        monkeypatch.setattr(module, 'AsyncOpenAI', lambda **kwargs: fake)
+    monkeypatch.setattr(builtins, 'input', lambda prompt='': 'ok')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', [str(RUN_AGENT), str(yaml_path), 'go', '--metrics-json', str(metrics)])
+
+    # Run the file the way `python run_agent.py ...` does.
+    runpy.run_path(str(RUN_AGENT), run_name='__main__')
+
+    assert 'helper: hi from helper' in capsys.readouterr().out
+    call_sites = {(row['agent'], row['call_site']) for row in json.loads(metrics.read_text())}
+    assert call_sites == {('main', 'root'), ('helper', 'main')}
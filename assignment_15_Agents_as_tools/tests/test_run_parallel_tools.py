@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+from run_agent import current_toolbox, run_parallel_tools
+from tools import ToolBox
+
+
+def echo(text: str) -> str:
+    """
+    Return the text unchanged.
+    :param text: Text to return.
+    """
+    return text
+
+
+def _run(calls: list) -> dict:
+    toolbox = ToolBox()
+    toolbox.tool(echo)
+
+    async def main():
+        current_toolbox.set(toolbox)
+        return json.loads(await run_parallel_tools(json.dumps(calls)))
+
+    return asyncio.run(main())
+
+
+def test_unknown_placeholder_passes_through():
+    result = _run([{"tool": "echo", "args": {"text": "echo ${HOME} `hi ${name}`"}}])
+    assert result["results"][0]["result"] == "echo ${HOME} `hi ${name}`"
+
+
+def test_index_placeholder_is_not_a_reference():
+    result = _run([
+        {"tool": "echo", "args": {"text": "first"}},
+        {"tool": "echo", "args": {"text": "x = ${0}"}},
+    ])
+    assert [r["result"] for r in result["results"]] == ["first", "x = ${0}"]
+
+
+def test_declared_id_is_substituted():
+    result = _run([
+        {"id": "a", "tool": "echo", "args": {"text": "first"}},
+        {"tool": "echo", "args": {"text": "got ${a} and ${b}"}},
+    ])
+    assert result["results"][1]["result"] == "got first and ${b}"
+
+
+def test_after_accepts_integer_index():
+    result = _run([
+        {"tool": "echo", "args": {"text": "first"}},
+        {"tool": "echo", "args": {"text": "second"}, "after": [0]},
+    ])
+    assert all(r["ok"] for r in result["results"])
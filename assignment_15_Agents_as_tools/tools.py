@@ -1,10 +1,20 @@
+import asyncio
+import functools
 import inspect
+import json
 import logging
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from types import UnionType
-from typing import Any, Callable, get_type_hints, Literal, get_origin, get_args, Union
+from typing import Any, Callable, Iterable, get_type_hints, Literal, get_origin, get_args, Union
 
 from openai.types.responses import FunctionToolParam
 
+from tracing import trace_span
+
 _tools: dict[str, Callable] = {}
 logger = logging.getLogger(__name__)
 
@@ -107,35 +117,265 @@ def generate_function_schema(func: Callable[..., Any]) -> FunctionToolParam:
     }
 
 
-class ToolBox:
-    _tools: list[FunctionToolParam]
+EXECUTION_POLICIES = ('inline', 'thread', 'process')
+
+
+def execution(policy: str = 'inline', max_concurrency: int | None = None):
+    """
+    Declare how a sync tool should run when a ToolBox calls it:
+    inline on the event loop, in a worker thread, or in a worker process.
+    max_concurrency caps how many calls of this tool run at once.
+    """
+    if policy not in EXECUTION_POLICIES:
+        raise ValueError(f"Unknown execution policy: {policy}")
+
+    def decorator(func):
+        func.__tool_execution__ = (policy, max_concurrency)
+        return func
+
+    return decorator
+
+
+@dataclass(frozen=True)
+class CacheOptions:
+    """
+    Memoization settings for an idempotent tool.
+    ttl: seconds a result stays valid (None = no expiry).
+    max_entries: LRU capacity.
+    key: maps the call kwargs to a hashable key (default: sorted JSON of kwargs).
+    scope: 'run' caches per ToolBox (one agent run), 'process' shares across ToolBoxes.
+    """
+    ttl: float | None = None
+    max_entries: int = 128
+    key: Callable[..., Any] | None = None
+    scope: Literal['run', 'process'] = 'run'
+
+
+@dataclass
+class _InFlight:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class ToolCache:
+    """LRU + TTL result cache for one tool, with hit/miss counters."""
+
+    def __init__(self, options: CacheOptions):
+        self.options = options
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self._in_flight: dict[Any, _InFlight] = {}
+
+    def make_key(self, kwargs: dict[str, Any]):
+        if self.options.key is not None:
+            return self.options.key(**kwargs)
+        return json.dumps(kwargs, sort_keys=True, default=str)
+
+    async def get_or_call(self, key, call):
+        if key in self._entries:
+            stored_at, value = self._entries[key]
+            if self.options.ttl is None or time.monotonic() - stored_at < self.options.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        # Concurrent identical calls share one execution instead of all missing. It runs
+        # as its own task so a cancelled caller only stops waiting; the call itself is
+        # cancelled once nobody is waiting for it.
+        if (entry := self._in_flight.get(key)) is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            entry = self._in_flight[key] = _InFlight(asyncio.ensure_future(call()))
+            entry.task.add_done_callback(lambda task: self._finish(key, task))
+
+        entry.waiters += 1
+        try:
+            return await asyncio.shield(entry.task)
+        finally:
+            entry.waiters -= 1
+            if entry.waiters == 0 and not entry.task.done():
+                entry.task.cancel()
+
+    def _finish(self, key, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is not None and self._in_flight[key].task is task:
+            del self._in_flight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._entries[key] = (time.monotonic(), task.result())
+        if len(self._entries) > self.options.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+# Process-scoped caches outlive any single ToolBox; keyed by the tool function.
+_process_caches: dict[Callable, ToolCache] = {}
+
+
+def memoize(
+    ttl: float | None = None,
+    max_entries: int = 128,
+    key: Callable[..., Any] | None = None,
+    scope: Literal['run', 'process'] = 'run',
+):
+    """Mark an idempotent tool so ToolBox memoizes its results."""
+    options = CacheOptions(ttl=ttl, max_entries=max_entries, key=key, scope=scope)
+
+    def decorator(func):
+        func.__tool_cache__ = options
+        return func
+
+    return decorator
+
+
+# Schemas depend only on the function, so toolboxes built per run can share them.
+_schema_cache: weakref.WeakKeyDictionary[Callable, FunctionToolParam] = weakref.WeakKeyDictionary()
+
+
+def cached_function_schema(func: Callable[..., Any]) -> FunctionToolParam:
+    try:
+        return _schema_cache[func]
+    except (KeyError, TypeError):
+        schema = generate_function_schema(func)
+    try:
+        _schema_cache[func] = schema
+    except TypeError:
+        pass  # not weak-referenceable (e.g. a functools.partial); just don't cache
+    return schema
+
 
-    def __init__(self):
-        self._funcs = {}
-        self._tools = []
+class ToolBox:
+    """
+    Name-indexed tool registry. Schemas are generated lazily the first time a
+    tool is offered to the model, and each distinct tool-name list resolves to a
+    cached list so run_agent iterations don't rebuild it.
+    """
+
+    def __init__(self, max_processes: int | None = None):
+        self._funcs: dict[str, Callable] = {}
+        self._schemas: dict[str, FunctionToolParam] = {}
+        self._tool_lists: dict[tuple[str, ...], list[FunctionToolParam]] = {}
+        self._policies: dict[str, str] = {}
+        self._limits: dict[str, asyncio.Semaphore] = {}
+        self._max_processes = max_processes
+        self._process_pool: ProcessPoolExecutor | None = None
+        self._caches: dict[str, ToolCache] = {}
+
+    def tool(
+        self,
+        func=None,
+        *,
+        policy: str | None = None,
+        max_concurrency: int | None = None,
+        cache: CacheOptions | bool | None = None,
+        schema: FunctionToolParam | None = None,
+    ):
+        """Register func as a tool. A precomputed `schema` skips generating it from the signature."""
+        if func is None:
+            return lambda f: self.tool(f, policy=policy, max_concurrency=max_concurrency, cache=cache, schema=schema)
+
+        declared_policy, declared_limit = getattr(func, '__tool_execution__', ('inline', None))
+        policy = policy or declared_policy
+        if policy not in EXECUTION_POLICIES:
+            raise ValueError(f"Unknown execution policy: {policy}")
+        max_concurrency = max_concurrency or declared_limit
 
-    def tool(self, func):
         self._funcs[func.__name__] = func
-        self._tools.append(generate_function_schema(func))
+        if schema is not None:
+            self._schemas[func.__name__] = schema
+        else:
+            self._schemas.pop(func.__name__, None)
+        self._tool_lists.clear()
+        self._policies[func.__name__] = policy
+        if max_concurrency:
+            self._limits[func.__name__] = asyncio.Semaphore(max_concurrency)
+
+        if cache is True:
+            cache = CacheOptions()
+        cache = cache or getattr(func, '__tool_cache__', None)
+        if cache:
+            if cache.scope == 'process':
+                self._caches[func.__name__] = _process_caches.setdefault(func, ToolCache(cache))
+            else:
+                self._caches[func.__name__] = ToolCache(cache)
         return func
 
+    def get_tool_function(self, tool_name: str) -> Callable | None:
+        return self._funcs.get(tool_name)
+
+    def schema(self, tool_name: str) -> FunctionToolParam:
+        if (schema := self._schemas.get(tool_name)) is None:
+            schema = self._schemas[tool_name] = cached_function_schema(self._funcs[tool_name])
+        return schema
+
+    def preload_tools(self, tool_names: list[str], tools: Iterable[FunctionToolParam]) -> None:
+        """Install a precomputed get_tools result (e.g. from a compiled agent graph) for tool_names."""
+        self._tool_lists[tuple(tool_names)] = list(tools)
+
     def get_tools(self, tool_names: list[str]) -> list[FunctionToolParam]:
-        tls = [
-            tool
-            for tool in self._tools
-            if tool['name'] in tool_names
-        ]
-        if 'web_search' in tool_names:
+        """Schemas for tool_names in registration order. The returned list is shared; don't mutate it."""
+        key = tuple(tool_names)
+        if (tls := self._tool_lists.get(key)) is not None:
+            return tls
+
+        wanted = set(tool_names)
+        tls = [self.schema(name) for name in self._funcs if name in wanted]
+        if 'web_search' in wanted:
             # noinspection PyTypeChecker
             tls.append({'type': 'web_search'})
+        self._tool_lists[key] = tls
         return tls
 
+    async def _call(self, tool_name: str, tool, kwargs):
+        if inspect.iscoroutinefunction(tool):
+            return await tool(**kwargs)
+
+        policy = self._policies.get(tool_name, 'inline')
+        if policy == 'thread':
+            # to_thread copies the context, so current_agent/current_toolbox still resolve.
+            result = await asyncio.to_thread(tool, **kwargs)
+        elif policy == 'process':
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self._max_processes)
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._process_pool, functools.partial(tool, **kwargs))
+        else:
+            result = tool(**kwargs)
+
+        if inspect.iscoroutine(result):
+            result = await result
+        return result
+
+    async def _limited_call(self, tool_name: str, tool, kwargs):
+        if limit := self._limits.get(tool_name):
+            async with limit:
+                return await self._call(tool_name, tool, kwargs)
+        return await self._call(tool_name, tool, kwargs)
+
+    def cache_stats(self) -> dict[str, dict[str, int]]:
+        """Hit/miss counters and current size for every memoized tool."""
+        return {name: cache.stats() for name, cache in self._caches.items()}
+
     async def run_tool(self, tool_name: str, **kwargs):
         logger.debug('TOOL %s(%s)', tool_name, kwargs)
         tool = self._funcs.get(tool_name)
-        result = tool(**kwargs)
-        if inspect.iscoroutine(result):
-            result = await result
+        with trace_span(tool_name, 'tool', policy=self._policies.get(tool_name)) as span:
+            if cache := self._caches.get(tool_name):
+                hits = cache.hits
+                result = await cache.get_or_call(cache.make_key(kwargs), lambda: self._limited_call(tool_name, tool, kwargs))
+                span.attrs['cache_hit'] = cache.hits > hits
+            else:
+                result = await self._limited_call(tool_name, tool, kwargs)
+            span.attrs['result_bytes'] = len(str(result))
 
         logger.debug('TOOL %s(%s) -> %s', tool_name, kwargs, result)
         return result
+
+    def shutdown(self) -> None:
+        if self._process_pool is not None:
+            self._process_pool.shutdown(cancel_futures=True)
+            self._process_pool = None
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Iterator
+
+current_tracer: ContextVar[Tracer | None] = ContextVar('current_tracer', default=None)
+current_span: ContextVar[Span | None] = ContextVar('current_span', default=None)
+
+
+@dataclass
+class Span:
+    span_id: int
+    parent_id: int | None
+    name: str
+    kind: str
+    start: float
+    end: float | None = None
+    lane: str = 'main'
+    attrs: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+
+class _NullSpan:
+    """Stand-in when no tracer is active, so call sites need no branching."""
+
+    @property
+    def attrs(self) -> dict[str, Any]:
+        return {}
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _lane() -> str:
+    # Concurrent tool calls run in separate tasks; giving each its own lane keeps
+    # Chrome's per-thread nesting valid when siblings overlap in time.
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return task.get_name()
+    return threading.current_thread().name
+
+
+class Tracer:
+    """Collects spans for LLM calls, tool calls and agent runs."""
+
+    def __init__(self):
+        self.spans: list[Span] = []
+        self._ids = itertools.count(1)
+
+    @contextmanager
+    def span(self, name: str, kind: str, **attrs: Any) -> Iterator[Span]:
+        parent = current_span.get()
+        span = Span(
+            span_id=next(self._ids),
+            parent_id=parent.span_id if parent else None,
+            name=name,
+            kind=kind,
+            start=time.time(),
+            lane=_lane(),
+            attrs=attrs,
+        )
+        self.spans.append(span)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.attrs['error'] = repr(exc)
+            raise
+        finally:
+            span.end = time.time()
+            current_span.reset(token)
+
+    def export_jsonl(self, path: str | Path) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            for span in self.spans:
+                f.write(json.dumps(asdict(span), default=str) + '\n')
+
+    def export_chrome(self, path: str | Path) -> None:
+        """Write Chrome trace-event JSON (open in chrome://tracing, Perfetto or speedscope)."""
+        lanes: dict[str, int] = {}
+        events = []
+        for span in self.spans:
+            tid = lanes.setdefault(span.lane, len(lanes) + 1)
+            events.append({
+                'name': span.name,
+                'cat': span.kind,
+                'ph': 'X',
+                'ts': span.start * 1_000_000,
+                'dur': span.duration * 1_000_000,
+                'pid': os.getpid(),
+                'tid': tid,
+                'args': {'span_id': span.span_id, 'parent_id': span.parent_id, **span.attrs},
+            })
+        events.extend(
+            {'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': lane}}
+            for lane, tid in lanes.items()
+        )
+        Path(path).write_text(json.dumps({'traceEvents': events}, default=str), encoding='utf-8')
+
+
+@contextmanager
+def trace_span(name: str, kind: str, **attrs: Any) -> Iterator[Span | _NullSpan]:
+    """Record a span on the active tracer, or do nothing when tracing is off."""
+    tracer = current_tracer.get()
+    if tracer is None:
+        yield _NULL_SPAN
+        return
+    with tracer.span(name, kind, **attrs) as span:
+        yield span
+
+
+def payload_size(value: Any) -> int:
+    if hasattr(value, 'model_dump_json'):
+        return len(value.model_dump_json())
+    if isinstance(value, list):
+        return sum(payload_size(v) for v in value)
+    return len(json.dumps(value, default=str))
+
+
+def record_response(span: Span | _NullSpan, request: dict[str, Any], response) -> None:
+    """Attach model, token counts and payload sizes of one Responses API call to its span."""
+    if span is _NULL_SPAN:
+        return
+    span.attrs['model'] = request.get('model')
+    span.attrs['request_bytes'] = payload_size(request.get('input', []))
+    span.attrs['response_bytes'] = payload_size(response.output)
+    if usage := response.usage:
+        span.attrs['input_tokens'] = usage.input_tokens
+        span.attrs['cached_tokens'] = usage.input_tokens_details.cached_tokens
+        span.attrs['output_tokens'] = usage.output_tokens
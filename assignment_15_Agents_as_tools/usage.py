@@ -1,11 +1,21 @@
 # Pricing per 1M tokens (USD) for recent OpenAI models, fetched March 6, 2026 from https://developers.openai.com/api/docs/pricing.
+import json
 import logging
 import sys
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
 
 from openai.types.responses import ResponseUsage
 
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class CompactionSavings:
+    """Usage-list entry recording input tokens a request avoided through history compaction."""
+    tokens_saved: int
+
 PRICING = {
     'gpt-5.4': {'input': 2.25, 'cached': 0.225, 'output': 18.00},
     'gpt-5.4-pro': {'input': 27.00, 'cached': 0.0, 'output': 216.00},
@@ -45,11 +55,34 @@ def _calculate_cost_usd(totals: dict[str, dict]) -> float:
     return total / 1_000_000
 
 
-def _aggregate_usage(usages: list[tuple[str, ResponseUsage]]):
+def response_cost_usd(model: str, usage: ResponseUsage) -> float:
+    """Cost of a single response, or 0 for models missing from PRICING."""
+    if model not in PRICING or usage is None:
+        return 0.0
+    return _calculate_cost_usd(_aggregate_usage([(model, usage)]))
+
+
+def _cache_savings_usd(totals: dict[str, dict]) -> float:
+    """Dollars saved by cached input tokens being billed at the cached rate instead of the input rate."""
+    total = 0
+    for model, usage in totals.items():
+        if rates := PRICING.get(model):
+            total += usage['cached'] * (rates['input'] - rates.get('cached', rates['input']))
+    return total / 1_000_000
+
+
+def _cache_hit_ratio(usage: dict) -> float:
+    return usage['cached'] / usage['input'] if usage['input'] else 0.0
+
+
+def _aggregate_usage(usages: list[tuple[str, ResponseUsage | CompactionSavings]]):
     total = {}
     for model, usage in usages:
         if model not in total:
             total[model] = {'input': 0, 'cached': 0, 'output': 0, 'reasoning': 0}
+        if isinstance(usage, CompactionSavings):
+            total[model]['compacted'] = total[model].get('compacted', 0) + usage.tokens_saved
+            continue
         total[model]['input'] += usage.input_tokens
         total[model]['cached'] += usage.input_tokens_details.cached_tokens
         total[model]['output'] += usage.output_tokens
@@ -57,16 +90,186 @@ def _aggregate_usage(usages: list[tuple[str, ResponseUsage]]):
     return total
 
 
-def print_usage(usages: list[tuple[str, ResponseUsage]], file=sys.stderr):
+def usage_summary(usages: list[tuple[str, ResponseUsage | CompactionSavings]]) -> dict:
+    """Per-model token totals plus overall tokens and cost, e.g. for one batch item."""
+    totals = _aggregate_usage(usages)
+    return {
+        'models': totals,
+        'tokens': sum(total['input'] + total['output'] for total in totals.values()),
+        'cost_usd': _calculate_cost_usd(totals),
+    }
+
+
+def print_usage(usages: list[tuple[str, ResponseUsage | CompactionSavings]], file=sys.stderr):
     print(' Usage '.center(30, '-'), file=file)
     totals = _aggregate_usage(usages)
     for model, total in totals.items():
         print(model.center(30, '~'), file=file)
         for key, value in total.items():
             print(f'{key.title()} (tokens):', value, file=file)
+        print(f'Cache hit ratio: {_cache_hit_ratio(total):.1%}', file=file)
+        print(f'{model} cache savings (USD): ${_cache_savings_usd({model: total}):.6f}', file=file)
         cost = _calculate_cost_usd({model: total})
         print(f'{model} cost (USD): ${cost:.6f}', file=file)
 
     cost = _calculate_cost_usd(totals)
     print('~'*30, file=file)
+    print(f'Total cache savings (USD): ${_cache_savings_usd(totals):.6f}', file=file)
     print(f'Total cost (USD): ${cost:.6f}', file=file)
+
+
+# Upper bounds (seconds) of the LLM latency histogram buckets.
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 30, 60, 120)
+
+
+@dataclass
+class UsageStats:
+    requests: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    reasoning_tokens: int = 0
+    compacted_tokens: int = 0
+    cost_usd: float = 0.0
+    latency_seconds: float = 0.0
+    max_latency_seconds: float = 0.0
+    latency_buckets: list[int] = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS))
+
+
+class UsageMeter:
+    """
+    Running usage totals keyed by (agent, model, call_site), updated as each
+    response arrives rather than rebuilt from the usage list. call_site is the
+    agent that invoked this one ('root' for the top-level agent).
+    """
+
+    def __init__(self):
+        self.stats: dict[tuple[str, str, str], UsageStats] = {}
+        # Memoized tool results, by tool name: {'hits': n, 'misses': n}.
+        self.tool_cache: dict[str, dict[str, int]] = {}
+
+    def _stats(self, agent: str, model: str, call_site: str) -> UsageStats:
+        key = (agent, model, call_site)
+        if key not in self.stats:
+            self.stats[key] = UsageStats()
+        return self.stats[key]
+
+    def record(self, agent: str, model: str, call_site: str, usage: ResponseUsage | None, latency: float) -> None:
+        stats = self._stats(agent, model, call_site)
+        stats.requests += 1
+        stats.latency_seconds += latency
+        stats.max_latency_seconds = max(stats.max_latency_seconds, latency)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                stats.latency_buckets[i] += 1
+                break
+        if usage is not None:
+            self._add_usage(stats, model, usage)
+
+    def record_restored(self, agent: str, model: str, call_site: str, usage: ResponseUsage | None) -> None:
+        """Tokens and cost of a request logged before a resumed run; its latency was not recorded."""
+        if usage is not None:
+            self._add_usage(self._stats(agent, model, call_site), model, usage)
+
+    @staticmethod
+    def _add_usage(stats: UsageStats, model: str, usage: ResponseUsage) -> None:
+        stats.input_tokens += usage.input_tokens
+        stats.cached_tokens += usage.input_tokens_details.cached_tokens
+        stats.output_tokens += usage.output_tokens
+        stats.reasoning_tokens += usage.output_tokens_details.reasoning_tokens
+        stats.cost_usd += response_cost_usd(model, usage)
+
+    def record_compaction(self, agent: str, model: str, call_site: str, savings: CompactionSavings) -> None:
+        self._stats(agent, model, call_site).compacted_tokens += savings.tokens_saved
+
+    def record_tool_cache(self, tool: str, hits: int, misses: int) -> None:
+        counters = self.tool_cache.setdefault(tool, {'hits': 0, 'misses': 0})
+        counters['hits'] += hits
+        counters['misses'] += misses
+
+    def to_json(self) -> list[dict]:
+        return [
+            {'agent': agent, 'model': model, 'call_site': call_site, **asdict(stats)}
+            for (agent, model, call_site), stats in self.stats.items()
+        ]
+
+    def to_prometheus(self, prefix: str = 'agent_llm') -> str:
+        """Prometheus text exposition format (counters plus a latency histogram)."""
+        lines: list[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+
+        def sample(name: str, labels: dict[str, str], value: float) -> None:
+            rendered = ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+            lines.append(f'{prefix}_{name}{{{rendered}}} {value}')
+
+        keyed = [
+            ({'agent': agent, 'model': model, 'call_site': call_site}, stats)
+            for (agent, model, call_site), stats in self.stats.items()
+        ]
+        family('requests_total', 'counter', 'Responses API requests.')
+        for labels, stats in keyed:
+            sample('requests_total', labels, stats.requests)
+        family('tokens_total', 'counter', 'Tokens by kind; cached is part of input, reasoning part of output.')
+        for labels, stats in keyed:
+            for kind in ('input', 'cached', 'output', 'reasoning', 'compacted'):
+                sample('tokens_total', {**labels, 'kind': kind}, getattr(stats, f'{kind}_tokens'))
+        family('cost_usd_total', 'counter', 'Estimated cost in USD from PRICING.')
+        for labels, stats in keyed:
+            sample('cost_usd_total', labels, round(stats.cost_usd, 8))
+        family('latency_seconds', 'histogram', 'Responses API request latency.')
+        for labels, stats in keyed:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats.latency_buckets):
+                cumulative += count
+                sample('latency_seconds_bucket', {**labels, 'le': str(bound)}, cumulative)
+            sample('latency_seconds_bucket', {**labels, 'le': '+Inf'}, stats.requests)
+            sample('latency_seconds_sum', labels, round(stats.latency_seconds, 6))
+            sample('latency_seconds_count', labels, stats.requests)
+        if self.tool_cache:
+            family('tool_cache_hits_total', 'counter', 'Memoized tool calls answered from the cache.')
+            for tool, counters in self.tool_cache.items():
+                sample('tool_cache_hits_total', {'tool': tool}, counters['hits'])
+            family('tool_cache_misses_total', 'counter', 'Memoized tool calls that ran the tool.')
+            for tool, counters in self.tool_cache.items():
+                sample('tool_cache_misses_total', {'tool': tool}, counters['misses'])
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path: str | Path) -> None:
+        Path(path).write_text(json.dumps(self.to_json(), indent=2), encoding='utf-8')
+
+    def write_prometheus(self, path: str | Path) -> None:
+        Path(path).write_text(self.to_prometheus(), encoding='utf-8')
+
+
+def print_usage_by_agent(meter: UsageMeter, file=sys.stderr) -> None:
+    if not meter.stats:
+        return
+    print(' Usage by agent '.center(30, '-'), file=file)
+    for (agent, model, call_site), stats in sorted(meter.stats.items()):
+        mean = stats.latency_seconds / stats.requests if stats.requests else 0.0
+        print(
+            f'{agent} <- {call_site} [{model}]: {stats.requests} requests, '
+            f'{stats.input_tokens + stats.output_tokens} tokens, ${stats.cost_usd:.6f}, '
+            f'{mean:.2f}s mean / {stats.max_latency_seconds:.2f}s max latency',
+            file=file,
+        )
+
+
+def print_tool_cache(meter: UsageMeter, file=sys.stderr) -> None:
+    if not meter.tool_cache:
+        return
+    print(' Tool cache '.center(30, '-'), file=file)
+    for tool, counters in sorted(meter.tool_cache.items()):
+        calls = counters['hits'] + counters['misses']
+        ratio = counters['hits'] / calls if calls else 0.0
+        print(f"{tool}: {counters['hits']} hits, {counters['misses']} misses ({ratio:.0%} hit ratio)", file=file)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+current_meter: ContextVar[UsageMeter | None] = ContextVar('current_meter', default=None)
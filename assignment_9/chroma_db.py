@@ -6,6 +6,9 @@ import os
 import chromadb
 from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
 
+from embedding_cache import CachedOpenAIEmbeddingFunction, EmbeddingCache, default_cache_path
+from numpy_index import NumpyVectorClient
+
 
 def get_chroma_client(persist_dir: Optional[str] = None) -> chromadb.Client:
     """Return a configured Chroma client.
@@ -20,10 +23,44 @@ def get_chroma_client(persist_dir: Optional[str] = None) -> chromadb.Client:
     return chromadb.Client()
 
 
-def get_openai_embedding_function(model_name: str = "text-embedding-3-small") -> OpenAIEmbeddingFunction:
+def get_vector_client(persist_dir: Optional[str] = None, backend: Optional[str] = None):
+    """Return a client for the chosen vector store backend.
+
+    - `backend` (or the `VECTOR_BACKEND` env var) is "chroma" (default) or "numpy".
+    - "numpy" stores each collection under `persist_dir` as a memory-mapped
+      matrix (see numpy_index.py); it has the same get_collection /
+      get_or_create_collection / query surface and opens instantly.
+    """
+    backend = (backend or os.environ.get("VECTOR_BACKEND") or "chroma").lower()
+    if backend == "numpy":
+        path = persist_dir or os.environ.get("CHROMA_PERSIST_DIR")
+        if not path:
+            raise ValueError("The numpy backend needs a persist_dir (or CHROMA_PERSIST_DIR).")
+        return NumpyVectorClient(path)
+    if backend != "chroma":
+        raise ValueError(f"Unknown vector backend: {backend}")
+    return get_chroma_client(persist_dir)
+
+
+def get_openai_embedding_function(
+    model_name: str = "text-embedding-3-small",
+    cache_path: Optional[str] = None,
+    use_cache: bool = True,
+    dimensions: Optional[int] = None,
+) -> OpenAIEmbeddingFunction:
     """Helper to create an OpenAI embedding function (uses OPENAI_API_KEY).
+
+    - By default embeddings are looked up in a persistent cache keyed by
+      (model, dimensions, sha256(text)) first, and only misses are sent to the API.
+      The cache file is `cache_path`, the `EMBEDDING_CACHE_PATH` env var,
+      or ./embedding_cache.sqlite3; it is created on the first cache miss.
+    - With `use_cache=False` every call goes to the API.
     """
-    return OpenAIEmbeddingFunction(model_name=model_name)
+    kwargs = {} if dimensions is None else {"dimensions": dimensions}
+    if not use_cache:
+        return OpenAIEmbeddingFunction(model_name=model_name, **kwargs)
+    cache = EmbeddingCache(cache_path or default_cache_path())
+    return CachedOpenAIEmbeddingFunction(cache, model_name=model_name, **kwargs)
 
 
 def get_or_create_collection(client: chromadb.Client, name: str, embedding_function: Optional[OpenAIEmbeddingFunction] = None):
@@ -1,7 +1,7 @@
 import os
 import sys
 from openai import OpenAI
-from chroma_db import get_chroma_client
+from chroma_db import get_vector_client
 
 # Default system prompt - can be overridden via command line or environment variable
 DEFAULT_SYSTEM_PROMPT = (
@@ -22,6 +22,7 @@ def main():
         print("  python conference_bot.py ./chroma_data conference_talks")
         print("  python conference_bot.py ./textbook_chroma textbook_paragraphs")
         print("  python conference_bot.py ./my_chroma my_collection \"You are a physics tutor...\"")
+        print("\nSet VECTOR_BACKEND=numpy to query a local NumPy index (see numpy_index.py) instead of Chroma.")
         sys.exit(0)
     
     # Get arguments
@@ -37,7 +38,7 @@ def main():
     
     # Initialize Chroma client
     print(f"Connecting to Chroma database: {chroma_dir}")
-    chroma_client = get_chroma_client(persist_dir=chroma_dir)
+    chroma_client = get_vector_client(persist_dir=chroma_dir)
     
     # Get the collection
     try:
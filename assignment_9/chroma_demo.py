@@ -6,9 +6,10 @@ from pathlib import Path
 from typing import Iterable, Any
 
 import chromadb
-from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from chroma_db import get_openai_embedding_function
+
 TEXT_EXTS = {
     ".txt", ".md", ".rst",
     ".py", ".js", ".ts", ".java", ".go", ".rs",
@@ -46,8 +47,8 @@ def ingest_folder(
     # Persistent DB
     client = chromadb.PersistentClient(path=persist_dir)
 
-    # OpenAI embeddings (uses OPENAI_API_KEY env var by default)
-    openai_ef = OpenAIEmbeddingFunction(model_name=openai_model)
+    # OpenAI embeddings (uses OPENAI_API_KEY env var by default), cached on disk by content hash
+    openai_ef = get_openai_embedding_function(model_name=openai_model)
 
     collection = client.get_or_create_collection(
         name=chroma_collection_name,
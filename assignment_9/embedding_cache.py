@@ -0,0 +1,136 @@
+"""Persistent embedding cache keyed by (model, sha256(text)).
+
+Embeddings are stored in one SQLite file as float32 blobs, so re-embedding text
+that was seen before (in an earlier run or another file) costs no API call. The
+file is only created on the first write, so query-only runs leave no file behind.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+
+DEFAULT_CACHE_PATH = "./embedding_cache.sqlite3"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite table of (model, text_hash) -> float32 vector blob. Safe to share between threads."""
+
+    def __init__(self, path: str | Path = DEFAULT_CACHE_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connection(self, create: bool) -> sqlite3.Connection | None:
+        """Open the file on first use; reads of a file that doesn't exist yet don't create it. Call with the lock held."""
+        if self._conn is None:
+            if not create and not self.path.exists():
+                return None
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " dim INTEGER NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, text_hash))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get_many(self, model: str, hashes: list[str]) -> dict[str, np.ndarray]:
+        """Cached vectors for whichever of `hashes` are present."""
+        found: dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            conn = self._connection(create=False)
+            if conn is None:
+                return found
+            # Stay well under SQLite's bound-parameter limit.
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, hashes: list[str], vectors) -> None:
+        rows = []
+        for key, vector in zip(hashes, vectors):
+            array = np.asarray(vector, dtype=np.float32)
+            rows.append((model, key, array.shape[0], array.tobytes()))
+        with self._lock:
+            conn = self._connection(create=True)
+            conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            conn = self._connection(create=False)
+            return conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] if conn else 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class CachedOpenAIEmbeddingFunction(OpenAIEmbeddingFunction):
+    """OpenAI embedding function that answers from an EmbeddingCache and only calls the API for misses.
+
+    It is still an OpenAIEmbeddingFunction, so Chroma collections created with
+    either one accept the other. Vectors are cached under the model name plus
+    `dimensions`, when given, since the same model returns vectors of a different length.
+    """
+
+    def __init__(
+        self,
+        cache: EmbeddingCache,
+        model_name: str = "text-embedding-3-small",
+        dimensions: int | None = None,
+        **kwargs,
+    ):
+        if dimensions is not None:
+            kwargs["dimensions"] = dimensions
+        super().__init__(model_name=model_name, **kwargs)
+        self.cache = cache
+        self.cache_model = model_name if dimensions is None else f"{model_name}@{dimensions}"
+        self.hits = 0
+        self.misses = 0
+        self.api_calls = 0
+
+    def __call__(self, input):
+        texts = list(input)
+        hashes = [text_hash(text) for text in texts]
+        found = self.cache.get_many(self.cache_model, hashes)
+
+        # Identical texts in one call are embedded once.
+        missing = {key: text for key, text in zip(hashes, texts) if key not in found}
+        self.hits += len(texts) - sum(1 for key in hashes if key in missing)
+        self.misses += len(missing)
+        if missing:
+            self.api_calls += 1
+            vectors = super().__call__(list(missing.values()))
+            arrays = [np.asarray(vector, dtype=np.float32) for vector in vectors]
+            self.cache.put_many(self.cache_model, list(missing), arrays)
+            found.update(zip(missing, arrays))
+        return [found[key] for key in hashes]
+
+
+def default_cache_path() -> str:
+    return os.environ.get("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH)
@@ -5,89 +5,439 @@ Takes text files separated by paragraphs (empty lines) and stores
 each paragraph's embedding in a persistent Chroma database.
 """
 
+import asyncio
+import hashlib
+import json
 import os
+import random
+import time
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict
 import csv
 
-from chroma_db import get_openai_embedding_function, get_chroma_client, get_or_create_collection
+import openai
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a conservative character estimate
+    tiktoken = None
+
+from chroma_db import get_openai_embedding_function, get_vector_client, get_or_create_collection
 collection_name = "par"
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Default cap on embedding requests in flight at once.
+DEFAULT_MAX_CONCURRENCY = 8
+# Default tokens-per-minute budget for the embeddings API (text-embedding-3-small, tier 1).
+DEFAULT_TOKENS_PER_MINUTE = 1_000_000
+# Errors worth retrying with backoff: throttling, timeouts and transient server failures.
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+@dataclass(frozen=True)
+class EmbeddingLimits:
+    """Per-request limits of the embeddings API, and the model's price."""
+    max_input_tokens: int = 8000  # per input; the API allows 8192, leave headroom for re-tokenized splits
+    max_request_tokens: int = 300_000  # summed over all inputs of one request
+    max_inputs: int = 2048
+    usd_per_million_tokens: float = 0.02
+
+
+EMBEDDING_MODELS = {
+    "text-embedding-3-small": EmbeddingLimits(usd_per_million_tokens=0.02),
+    "text-embedding-3-large": EmbeddingLimits(usd_per_million_tokens=0.13),
+    "text-embedding-ada-002": EmbeddingLimits(usd_per_million_tokens=0.10),
+}
+
+
 def embed_folder_of_txtfiles(
     folder_path: str,
     persist_dir: str = "./chroma_data",
-    collection_name: str = "paragraphs"
+    collection_name: str = "paragraphs",
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+    dry_run: bool = False,
 ) -> None:
     """Embed all txt files in a folder and store in persistent Chroma DB.
-    
+
+    Ingestion is incremental: a manifest kept next to the database records each
+    file's size, mtime and content hash, so only new or changed files are
+    embedded. Their paragraphs are upserted, and ids left over from removed
+    files or paragraphs are deleted.
+
+    Paragraphs of all changed files are packed together into requests filled
+    to the model's token limits, which are embedded concurrently (up to
+    `max_concurrency` at once); each file is stored, in file order, as soon as
+    the requests holding its paragraphs are done.
+
     Args:
         folder_path: Path to folder containing .txt files
         persist_dir: Directory to store Chroma database (default: ./chroma_data)
         collection_name: Name of collection in Chroma DB (default: paragraphs)
+        max_concurrency: Maximum embedding requests in flight at once
+        tokens_per_minute: Embedding token budget the requests are throttled to
+        dry_run: Only print how many requests the changed files need and their estimated cost
     """
+    asyncio.run(embed_folder_of_txtfiles_async(
+        folder_path, persist_dir, collection_name, max_concurrency, tokens_per_minute, dry_run
+    ))
+
+
+async def embed_folder_of_txtfiles_async(
+    folder_path: str,
+    persist_dir: str = "./chroma_data",
+    collection_name: str = "paragraphs",
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+    dry_run: bool = False,
+) -> None:
+    """Async version of embed_folder_of_txtfiles."""
     folder = Path(folder_path).expanduser().resolve()
     if not folder.is_dir():
         raise NotADirectoryError(f"Not a directory: {folder}")
+
+    manifest = FileManifest.load(Path(persist_dir) / f"{collection_name}.manifest.json")
     
     # Find all txt files
     txt_files = sorted(folder.glob("*.txt"))
-    if not txt_files:
+    if not txt_files and not manifest.files:
         print(f"No .txt files found in {folder}")
         return
     
     print(f"Found {len(txt_files)} txt files")
+
+    changed = []
+    for txt_file in txt_files:
+        if manifest.changed(txt_file, str(txt_file.relative_to(folder))):
+            changed.append(txt_file)
+    present = {str(txt_file.relative_to(folder)) for txt_file in txt_files}
+    removed = [source for source in manifest.files if source not in present]
+    print(f"  {len(changed)} new or changed, {len(txt_files) - len(changed)} unchanged, {len(removed)} removed")
+
+    groups = [split_paragraphs(read_paragraphs(str(txt_file))) for txt_file in changed]
+    if dry_run:
+        print_request_plan(pack_requests([piece for pieces, _ in groups for piece in pieces],
+                                         [count for _, counts in groups for count in counts]))
+        return
     
     # Set up persistent Chroma client and collection
-    client = get_chroma_client(persist_dir=persist_dir)
-    embedding_fn = get_openai_embedding_function(model_name="text-embedding-3-small")
+    client = get_vector_client(persist_dir=persist_dir)
+    embedding_fn = get_openai_embedding_function(model_name=EMBEDDING_MODEL)
     collection = get_or_create_collection(client, collection_name, embedding_fn)
+
+    for source in removed:
+        entry = manifest.files.pop(source)
+        # An empty id list is an unfiltered delete in Chroma, so skip files that stored nothing.
+        if entry["paragraphs"]:
+            collection.delete(ids=paragraph_ids(Path(source).stem, 0, entry["paragraphs"]))
+        print(f"Removed {source} ({entry['paragraphs']} paragraphs)")
+
+    # One engine for all files, so the concurrency cap and token budget are shared.
+    engine = EmbeddingEngine(embedding_fn, max_concurrency, tokens_per_minute)
+    start = time.perf_counter()
+    embedded_files = embed_groups(groups, engine)
     
     total_paragraphs = 0
     
-    # Process each txt file
-    for txt_file in txt_files:
-        print(f"\nProcessing {txt_file.name}...")
-        
-        # Use embed_paragraphs_from_file to get list of (embedding, paragraph) tuples
-        embedding_paragraph_pairs = embed_paragraphs_from_file(str(txt_file))
-        
-        if not embedding_paragraph_pairs:
-            print(f"  No paragraphs found")
-            continue
-        
-        # Prepare data for Chroma
-        ids = []
-        docs = []
-        embeddings = []
-        metadatas = []
-        
-        for i, (embedding_list, paragraph) in enumerate(embedding_paragraph_pairs):
-            para_id = f"{txt_file.stem}::{i}"
-            ids.append(para_id)
-            docs.append(paragraph)
-            embeddings.append(embedding_list)  # Already a list of Python floats
-            metadatas.append({
-                "filename": txt_file.name,
-                "paragraph_index": i,
-                "source": str(txt_file.relative_to(folder))
-            })
-        
-        collection.add(ids=ids, documents=docs, embeddings=embeddings, metadatas=metadatas)
-        total_paragraphs += len(embedding_paragraph_pairs)
-        print(f"  Added {len(embedding_paragraph_pairs)} paragraphs")
+    try:
+        # Process each txt file
+        for txt_file in changed:
+            print(f"\nProcessing {txt_file.name}...")
+            source = str(txt_file.relative_to(folder))
+            previous = manifest.files.get(source, {}).get("paragraphs", 0)
+
+            # Later files keep embedding while this one is stored.
+            embedding_paragraph_pairs = await anext(embedded_files)
+
+            # Paragraphs past the new end of the file are gone.
+            if previous > len(embedding_paragraph_pairs):
+                collection.delete(ids=paragraph_ids(txt_file.stem, len(embedding_paragraph_pairs), previous))
+
+            if not embedding_paragraph_pairs:
+                print(f"  No paragraphs found")
+                manifest.record(txt_file, source, 0)
+                continue
+
+            # Prepare data for Chroma
+            ids = []
+            docs = []
+            embeddings = []
+            metadatas = []
+
+            for i, (embedding_list, paragraph) in enumerate(embedding_paragraph_pairs):
+                para_id = f"{txt_file.stem}::{i}"
+                ids.append(para_id)
+                docs.append(paragraph)
+                embeddings.append(embedding_list)  # Already a list of Python floats
+                metadatas.append({
+                    "filename": txt_file.name,
+                    "paragraph_index": i,
+                    "source": source
+                })
+
+            # Upsert: a changed file overwrites its own earlier paragraphs
+            collection.upsert(ids=ids, documents=docs, embeddings=embeddings, metadatas=metadatas)
+            manifest.record(txt_file, source, len(embedding_paragraph_pairs))
+            total_paragraphs += len(embedding_paragraph_pairs)
+            print(f"  Stored {len(embedding_paragraph_pairs)} paragraphs")
+    finally:
+        await embedded_files.aclose()
+        # Files stored before an interruption are not embedded again on the next run.
+        manifest.save()
     
     print(f"\n✓ Successfully stored {total_paragraphs} paragraphs in '{collection_name}' (persisted at '{persist_dir}')")
+    _print_throughput(total_paragraphs, time.perf_counter() - start, engine)
+
+
+def paragraph_ids(stem: str, start: int, stop: int) -> list[str]:
+    return [f"{stem}::{i}" for i in range(start, stop)]
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FileManifest:
+    """What was ingested from each file: {source: {size, mtime, sha256, paragraphs}}, saved as JSON."""
+
+    def __init__(self, path: Path, files: dict[str, dict] | None = None):
+        self.path = path
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, path: Path) -> "FileManifest":
+        if path.exists():
+            return cls(path, json.loads(path.read_text(encoding="utf-8")).get("files", {}))
+        return cls(path)
+
+    def changed(self, file_path: Path, source: str) -> bool:
+        """True unless the file is known and unchanged; size and mtime are checked before hashing."""
+        entry = self.files.get(source)
+        if entry is None:
+            return True
+        stat = file_path.stat()
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return False
+        if entry["size"] == stat.st_size and entry["sha256"] == file_sha256(file_path):
+            entry["mtime"] = stat.st_mtime_ns  # touched but not edited
+            return False
+        return True
+
+    def record(self, file_path: Path, source: str, paragraphs: int) -> None:
+        stat = file_path.stat()
+        self.files[source] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "sha256": file_sha256(file_path),
+            "paragraphs": paragraphs,
+        }
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"files": self.files}, indent=1, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+class TokenRateLimiter:
+    """Token bucket refilled at `tokens_per_minute`; requests wait until their estimated tokens fit."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int) -> None:
+        tokens = min(tokens, self.capacity)  # an oversized request still gets through, alone
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                await asyncio.sleep((tokens - self.available) / self.rate)
+
+
+class EmbeddingEngine:
+    """Runs a (blocking) embedding function on batches concurrently, throttled and retried.
 
-def embed_paragraphs_from_file(file_path: str, max_chars_per_batch: int = 600000) -> list[tuple[list[float], str]]:
-    """Read a text or CSV file, extract paragraphs/rows, embed in batches, and return list of (embedding, text) tuples.
-    
     Args:
-        file_path: Path to the text or CSV file to embed
-        max_chars_per_batch: Maximum characters to embed at once to avoid token limits (default: 600k)
-        
-    Returns:
-        List of tuples: (embedding_vector, text) where embedding_vector is a list of floats
+        embedding_fn: Callable mapping a list of texts to a list of vectors
+        max_concurrency: Maximum batches in flight at once
+        tokens_per_minute: Token budget shared by all batches
+        max_retries: Attempts after the first for rate-limit and transient errors
     """
+
+    def __init__(
+        self,
+        embedding_fn,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+        max_retries: int = 5,
+    ):
+        self.embedding_fn = embedding_fn
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.limiter = TokenRateLimiter(tokens_per_minute)
+        self.max_retries = max_retries
+        self.requests = 0
+        self.retries = 0
+
+    async def embed_batch(self, batch: list[str], tokens: int | None = None) -> list[list[float]]:
+        async with self.semaphore:
+            await self.limiter.acquire(tokens if tokens is not None else sum(map(count_tokens, batch)))
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self.requests += 1
+                    embeddings = await asyncio.to_thread(self.embedding_fn, batch)
+                    return [_to_float_list(embedding) for embedding in embeddings]
+                except RETRYABLE_ERRORS as exc:
+                    if attempt == self.max_retries:
+                        raise
+                    self.retries += 1
+                    delay = min(60.0, 2 ** attempt) * (0.5 + random.random())
+                    print(f"    {type(exc).__name__}; retrying batch of {len(batch)} in {delay:.1f}s", flush=True)
+                    await asyncio.sleep(delay)
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = EMBEDDING_MODEL) -> int:
+    """Tokens in `text` for `model`; without tiktoken, an overestimate (3 characters per token)."""
+    if tiktoken is None:
+        return len(text) // 3 + 1
+    return len(_encoding(model).encode_ordinary(text))
+
+
+def split_text(text: str, max_tokens: int, model: str = EMBEDDING_MODEL) -> list[str]:
+    """Cut `text` into consecutive pieces of at most `max_tokens` tokens."""
+    if tiktoken is not None:
+        encoding = _encoding(model)
+        tokens = encoding.encode_ordinary(text)
+        return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+    max_chars = (max_tokens - 1) * 3
+    pieces = []
+    while len(text) > max_chars:
+        # Prefer to cut at whitespace in the second half of the window
+        cut = text.rfind(" ", max_chars // 2, max_chars)
+        cut = cut if cut > 0 else max_chars
+        pieces.append(text[:cut].strip())
+        text = text[cut:].strip()
+    return pieces + [text] if text else pieces
+
+
+def split_paragraphs(paragraphs: list[str], model: str = EMBEDDING_MODEL) -> tuple[list[str], list[int]]:
+    """Split paragraphs over the model's per-input limit; returns the pieces and their token counts."""
+    limit = EMBEDDING_MODELS.get(model, EmbeddingLimits()).max_input_tokens
+    pieces, counts = [], []
+    for paragraph in paragraphs:
+        tokens = count_tokens(paragraph, model)
+        if tokens <= limit:
+            pieces.append(paragraph)
+            counts.append(tokens)
+            continue
+        for piece in split_text(paragraph, limit, model):
+            pieces.append(piece)
+            counts.append(count_tokens(piece, model))
+    return pieces, counts
+
+
+@dataclass
+class EmbeddingRequest:
+    texts: list[str]
+    tokens: int
+
+
+def pack_requests(texts: list[str], counts: list[int], model: str = EMBEDDING_MODEL) -> list[EmbeddingRequest]:
+    """Greedily fill requests, in order, up to the model's per-request token and input limits."""
+    limits = EMBEDDING_MODELS.get(model, EmbeddingLimits())
+    requests: list[EmbeddingRequest] = []
+    current = EmbeddingRequest([], 0)
+    for text, tokens in zip(texts, counts):
+        if current.texts and (current.tokens + tokens > limits.max_request_tokens or len(current.texts) == limits.max_inputs):
+            requests.append(current)
+            current = EmbeddingRequest([], 0)
+        current.texts.append(text)
+        current.tokens += tokens
+    if current.texts:
+        requests.append(current)
+    return requests
+
+
+def print_request_plan(requests: list[EmbeddingRequest], model: str = EMBEDDING_MODEL) -> None:
+    tokens = sum(request.tokens for request in requests)
+    texts = sum(len(request.texts) for request in requests)
+    cost = tokens / 1_000_000 * EMBEDDING_MODELS.get(model, EmbeddingLimits()).usd_per_million_tokens
+    counted = "counted with tiktoken" if tiktoken is not None else "estimated, tiktoken not installed"
+    print(f"  Dry run: {texts} paragraphs in {len(requests)} request(s), {tokens} tokens ({counted})")
+    print(f"  Estimated cost with {model}: ${cost:.6f} (before embedding-cache hits)")
+
+
+async def embed_groups(groups: list[tuple[list[str], list[int]]], engine: EmbeddingEngine):
+    """Embed groups of texts (e.g. one per file) packed together into shared requests.
+
+    Yields one list of (embedding, text) pairs per group, in group order, as soon
+    as every request holding part of that group is done.
+    """
+    texts = [text for pieces, _ in groups for text in pieces]
+    requests = pack_requests(texts, [count for _, counts in groups for count in counts])
+    tasks = [asyncio.create_task(engine.embed_batch(request.texts, request.tokens)) for request in requests]
+    try:
+        # Embeddings of finished requests not yet handed to a group
+        buffer: list[list[float]] = []
+        next_task = 0
+        for pieces, _ in groups:
+            while len(buffer) < len(pieces):
+                buffer.extend(await tasks[next_task])
+                tasks[next_task] = None  # the buffer holds the result now
+                next_task += 1
+            yield list(zip(buffer[:len(pieces)], pieces))
+            del buffer[:len(pieces)]
+    finally:
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+
+
+def _to_float_list(embedding) -> list[float]:
+    # Convert to list of Python floats
+    if hasattr(embedding, 'tolist'):
+        return embedding.tolist()
+    return [float(x) for x in embedding]
+
+
+def _print_throughput(paragraphs: int, seconds: float, engine: EmbeddingEngine) -> None:
+    rate = paragraphs / seconds if seconds > 0 else 0.0
+    print(f"  Embedded {paragraphs} paragraphs in {seconds:.1f}s ({rate:.1f} paragraphs/s, "
+          f"{engine.requests} requests, {engine.retries} retries)")
+    if hasattr(engine.embedding_fn, "cache"):
+        fn = engine.embedding_fn
+        print(f"  Embedding cache: {fn.hits} hits, {fn.misses} misses, {fn.api_calls} API calls")
+
+
+def read_paragraphs(file_path: str) -> list[str]:
+    """Read a text or CSV file and return its paragraphs/rows worth embedding."""
     path = Path(file_path).expanduser().resolve()
     if not path.is_file():
         raise FileNotFoundError(f"File not found: {path}")
@@ -110,62 +460,66 @@ def embed_paragraphs_from_file(file_path: str, max_chars_per_batch: int = 600000
         text = path.read_text(encoding="utf-8")
         paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
     
-    # Filter out empty paragraphs and ones that are too long
-    paragraphs = [
+    # Filter out empty paragraphs; long ones are split later, at the model's token limit
+    return [
         p for p in paragraphs
-        if p and isinstance(p, str) and len(p.strip()) > 20 and len(p) < 8000
+        if p and isinstance(p, str) and len(p.strip()) > 20
     ]
+
+
+def embed_paragraphs_from_file(
+    file_path: str,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+    dry_run: bool = False,
+) -> list[tuple[list[float], str]]:
+    """Read a text or CSV file, extract paragraphs/rows, embed in batches, and return list of (embedding, text) tuples.
+
+    Paragraphs longer than the model's per-input token limit are split into
+    consecutive pieces, and requests are filled up to the per-request limits.
     
+    Args:
+        file_path: Path to the text or CSV file to embed
+        max_concurrency: Maximum requests embedded at once
+        tokens_per_minute: Embedding token budget the requests are throttled to
+        dry_run: Only print how many requests the file needs and their estimated cost
+        
+    Returns:
+        List of tuples: (embedding_vector, text) where embedding_vector is a list of floats,
+        in the file's paragraph order (empty for a dry run)
+    """
+    if dry_run:
+        print_request_plan(pack_requests(*split_paragraphs(read_paragraphs(file_path))))
+        return []
+    embedding_fn = get_openai_embedding_function(model_name=EMBEDDING_MODEL)
+    engine = EmbeddingEngine(embedding_fn, max_concurrency, tokens_per_minute)
+    start = time.perf_counter()
+    result = asyncio.run(embed_paragraphs_async(file_path, engine))
+    if result:
+        _print_throughput(len(result), time.perf_counter() - start, engine)
+    return result
+
+
+async def embed_paragraphs_async(
+    file_path: str,
+    engine: EmbeddingEngine | None = None,
+) -> list[tuple[list[float], str]]:
+    """Async version of embed_paragraphs_from_file."""
+    paragraphs = read_paragraphs(file_path)
     if not paragraphs:
         print(f"No valid paragraphs found in {file_path}")
         return []
-    
-    # Get embedding function
-    embedding_fn = get_openai_embedding_function(model_name="text-embedding-3-small")
-    
-    # Batch paragraphs by character count to avoid exceeding token limits
-    batches = []
-    current_batch = []
-    current_char_count = 0
-    
-    for paragraph in paragraphs:
-        para_chars = len(paragraph)
-        
-        # If adding this paragraph exceeds limit, start a new batch
-        if current_char_count + para_chars > max_chars_per_batch and current_batch:
-            batches.append(current_batch)
-            current_batch = [paragraph]
-            current_char_count = para_chars
-        else:
-            current_batch.append(paragraph)
-            current_char_count += para_chars
-    
-    # Add final batch
-    if current_batch:
-        batches.append(current_batch)
-    
-    print(f"  Embedding {len(paragraphs)} paragraphs in {len(batches)} batch(es)...")
-    
-    # Embed each batch and collect results
+
+    if engine is None:
+        engine = EmbeddingEngine(get_openai_embedding_function(model_name=EMBEDDING_MODEL))
+
+    pieces, counts = split_paragraphs(paragraphs)
+    print(f"  Embedding {len(paragraphs)} paragraphs as {len(pieces)} inputs in "
+          f"{len(pack_requests(pieces, counts))} request(s)...")
+
     result = []
-    for batch_idx, batch in enumerate(batches, 1):
-        if len(batches) > 1:
-            print(f"    Batch {batch_idx}/{len(batches)}: {len(batch)} paragraphs...", end=" ", flush=True)
-        
-        embeddings = embedding_fn(batch)  # Returns list of embedding vectors
-        
-        # Convert embeddings to proper format and pair with paragraphs
-        for embedding, paragraph in zip(embeddings, batch):
-            # Convert to list of Python floats
-            if hasattr(embedding, 'tolist'):
-                embedding_list = embedding.tolist()
-            else:
-                embedding_list = [float(x) for x in embedding]
-            result.append((embedding_list, paragraph))
-        
-        if len(batches) > 1:
-            print(f"✓")
-    
+    async for pairs in embed_groups([(pieces, counts)], engine):
+        result.extend(pairs)
     print(f"  Successfully embedded {len(result)} paragraphs")
     return result
 
@@ -173,20 +527,24 @@ def embed_paragraphs_from_file(file_path: str, max_chars_per_batch: int = 600000
 if __name__ == "__main__":
     import sys
     
-    if len(sys.argv) < 2:
+    dry_run = "--dry-run" in sys.argv
+    args = [arg for arg in sys.argv if arg != "--dry-run"]
+    
+    if len(args) < 2:
         print("Usage:")
         print("  python embedtxt.py <file>                  # Embed single .txt or .csv file")
         print("  python embedtxt.py <folder>               # Embed all .txt and .csv in folder (stores to Chroma)")
         print("  python embedtxt.py <folder> <db_dir>      # Specify custom Chroma database directory")
+        print("  add --dry-run                              # Print request count and estimated cost only")
         sys.exit(1)
     
-    path = sys.argv[1]
+    path = args[1]
     path_obj = Path(path).expanduser().resolve()
     
     if path_obj.is_file() and path_obj.suffix.lower() in [".txt", ".csv"]:
         # Single file mode
         print(f"Reading single file: {path_obj}")
-        embedding_pairs = embed_paragraphs_from_file(path)
+        embedding_pairs = embed_paragraphs_from_file(path, dry_run=dry_run)
         
         if embedding_pairs:
             print(f"\nTotal paragraphs extracted: {len(embedding_pairs)}")
@@ -196,9 +554,9 @@ if __name__ == "__main__":
     
     elif path_obj.is_dir():
         # Folder mode - embed all and store to Chroma
-        persist_dir = sys.argv[2] if len(sys.argv) > 2 else "./chroma_data"
+        persist_dir = args[2] if len(args) > 2 else "./chroma_data"
         print(f"Reading folder: {path_obj}")
-        embed_folder_of_txtfiles(path, persist_dir=persist_dir,collection_name=collection_name)
+        embed_folder_of_txtfiles(path, persist_dir=persist_dir,collection_name=collection_name, dry_run=dry_run)
     
     else:
         print(f"Error: {path} is not a valid file (.txt or .csv) or folder")
@@ -0,0 +1,314 @@
+"""Local vector index with the Chroma collection surface the bots and ingest scripts use.
+
+Each collection is a directory holding:
+  vectors.f32    row-major float32 matrix of unit-length embeddings, memory-mapped
+  alive.u8       one byte per row, 0 once the row is deleted
+  items.sqlite3  id, document and metadata per row, plus the collection's settings
+
+Opening a collection only maps the files, so there is no index to load at start-up.
+A query is one matrix-vector product over the mapped matrix and an argpartition for
+the top k. Distances are cosine distances (1 - cosine similarity).
+
+    python numpy_index.py import <chroma_dir> <collection> [dest_dir]
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _embedding_model(embedding_function) -> Optional[str]:
+    for attr in ("cache_model", "model_name", "_model_name"):
+        if isinstance(value := getattr(embedding_function, attr, None), str):
+            return value
+    return None
+
+
+class NumpyCollection:
+    """A collection stored as a memory-mapped float32 matrix plus a SQLite metadata table."""
+
+    def __init__(self, path: Path, name: str, embedding_function=None):
+        self.path = path
+        self.name = name
+        path.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = path / "vectors.f32"
+        self._alive_path = path / "alive.u8"
+        self._db = sqlite3.connect(path / "items.sqlite3")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+        for p in (self._vectors_path, self._alive_path):
+            p.touch()
+        self._matrix: Optional[np.ndarray] = None
+        self._alive: Optional[np.ndarray] = None
+
+        if embedding_function is not None and self._setting("model") is None:
+            if model := _embedding_model(embedding_function):
+                self._set_setting("model", model)
+        self._embedding_function = embedding_function
+
+    # -- settings and mapped files --
+
+    def _setting(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_setting(self, key: str, value: str) -> None:
+        self._db.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (key, value))
+        self._db.commit()
+
+    @property
+    def dim(self) -> Optional[int]:
+        value = self._setting("dim")
+        return int(value) if value else None
+
+    def _rows(self) -> int:
+        return self._alive_path.stat().st_size
+
+    def _vectors(self) -> np.ndarray:
+        if self._matrix is None:
+            rows, dim = self._rows(), self.dim or 0
+            if rows == 0:
+                self._matrix = np.empty((0, dim), dtype=np.float32)
+            else:
+                self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, dim))
+        return self._matrix
+
+    def _alive_mask(self) -> np.ndarray:
+        if self._alive is None:
+            rows = self._rows()
+            self._alive = (
+                np.memmap(self._alive_path, dtype=np.uint8, mode="r", shape=(rows,)).astype(bool)
+                if rows else np.zeros(0, dtype=bool)
+            )
+        return self._alive
+
+    def _invalidate(self) -> None:
+        self._matrix = None
+        self._alive = None
+
+    @property
+    def embedding_function(self):
+        if self._embedding_function is None:
+            # Imported here: chroma_db imports this module to offer it as a backend.
+            from chroma_db import get_openai_embedding_function
+            self._embedding_function = get_openai_embedding_function(self._setting("model") or "text-embedding-3-small")
+        return self._embedding_function
+
+    def _embed(self, texts: list[str]) -> np.ndarray:
+        return np.asarray(self.embedding_function(texts), dtype=np.float32)
+
+    # -- writes --
+
+    def _write(self, ids, embeddings, documents, metadatas, overwrite: bool) -> None:
+        if embeddings is None:
+            embeddings = self._embed(list(documents))
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        if self.dim is None:
+            self._set_setting("dim", str(vectors.shape[1]))
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimension {self.dim}")
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [None] * len(ids)
+
+        existing = dict(self._select("SELECT id, row FROM items WHERE id IN ({})", list(ids)))
+        row_bytes = vectors.shape[1] * 4
+        next_row = self._rows()
+        with open(self._vectors_path, "r+b") as vf, open(self._alive_path, "r+b") as af:
+            for item_id, vector, document, metadata in zip(ids, vectors, documents, metadatas):
+                meta = json.dumps(metadata) if metadata is not None else None
+                if item_id in existing:
+                    if not overwrite:
+                        continue  # like Chroma, adding an existing id leaves it alone
+                    row = existing[item_id]
+                    self._db.execute("UPDATE items SET document = ?, metadata = ? WHERE row = ?", (document, meta, row))
+                else:
+                    row = next_row
+                    next_row += 1
+                    existing[item_id] = row
+                    self._db.execute("INSERT INTO items VALUES (?, ?, ?, ?)", (row, item_id, document, meta))
+                vf.seek(row * row_bytes)
+                vf.write(vector.tobytes())
+                af.seek(row)
+                af.write(b"\x01")
+        self._db.commit()
+        self._invalidate()
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None) -> None:
+        self._write(ids, embeddings, documents, metadatas, overwrite=False)
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None) -> None:
+        self._write(ids, embeddings, documents, metadatas, overwrite=True)
+
+    def delete(self, ids=None, where: Optional[dict[str, Any]] = None) -> None:
+        if ids is None and not where:
+            raise ValueError("delete() needs ids or a where filter; it will not empty the whole collection.")
+        rows = [row for row, *_ in self._items(ids, where)]
+        if not rows:
+            return
+        with open(self._alive_path, "r+b") as af:
+            for row in rows:
+                af.seek(row)
+                af.write(b"\x00")
+        self._db.executemany("DELETE FROM items WHERE row = ?", [(row,) for row in rows])
+        self._db.commit()
+        self._invalidate()
+
+    # -- reads --
+
+    def _select(self, sql: str, values: list, params: tuple = ()) -> list[tuple]:
+        """Run sql with its IN ({}) list filled from values in chunks; params bind before the list."""
+        results = []
+        # Stay under SQLite's bound-parameter limit.
+        for start in range(0, len(values), 500):
+            chunk = values[start:start + 500]
+            results.extend(self._db.execute(sql.format(",".join("?" * len(chunk))), [*params, *chunk]).fetchall())
+        return results
+
+    def _items(self, ids=None, where: Optional[dict[str, Any]] = None, limit=None, offset=None) -> list[tuple]:
+        """(row, id, document, metadata) for rows matching ids and an equality `where` on metadata."""
+        sql = "SELECT row, id, document, metadata FROM items"
+        clauses, params = [], []
+        for key, value in (where or {}).items():
+            clauses.append("json_extract(metadata, ?) = ?")
+            params.extend([f"$.{key}", value])
+        if ids is not None:
+            # Chunked, so ordering and paging happen once the chunks are merged.
+            clauses.append("id IN ({})")
+            sql += " WHERE " + " AND ".join(clauses)
+            rows = sorted(self._select(sql, list(dict.fromkeys(ids)), tuple(params)))
+            start = offset or 0
+            return rows[start:] if limit is None else rows[start:start + limit]
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY row"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([-1 if limit is None else limit, offset or 0])
+        return self._db.execute(sql, params).fetchall()
+
+    def count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")) -> dict[str, Any]:
+        items = self._items(ids, where, limit, offset)
+        result: dict[str, Any] = {"ids": [item_id for _, item_id, _, _ in items]}
+        if "documents" in include:
+            result["documents"] = [document for _, _, document, _ in items]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(meta) if meta else None for *_, meta in items]
+        if "embeddings" in include:
+            result["embeddings"] = [self._vectors()[row].tolist() for row, *_ in items]
+        return result
+
+    def query(
+        self,
+        query_texts=None,
+        query_embeddings=None,
+        n_results: int = 10,
+        where: Optional[dict[str, Any]] = None,
+        include=("documents", "metadatas", "distances"),
+    ) -> dict[str, Any]:
+        if query_embeddings is None:
+            query_embeddings = self._embed(list(query_texts))
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = _normalize(queries.reshape(-1, queries.shape[-1]))
+
+        mask = self._alive_mask()
+        if where:
+            allowed = np.zeros_like(mask)
+            allowed[[row for row, *_ in self._items(where=where)]] = True
+            mask = mask & allowed
+        k = int(min(n_results, mask.sum()))
+
+        result: dict[str, list] = {"ids": []}
+        for key in ("documents", "metadatas", "distances"):
+            if key in include:
+                result[key] = []
+        # One pass over the mapped matrix scores every query
+        scores = queries @ self._vectors().T if k else np.zeros((len(queries), 0), dtype=np.float32)
+        for row_scores in scores:
+            top = np.empty(0, dtype=np.int64)
+            if k:
+                row_scores = np.where(mask, row_scores, -np.inf)
+                top = np.argpartition(-row_scores, k - 1)[:k]
+                top = top[np.argsort(-row_scores[top])]
+            found = {row: rest for row, *rest in self._select(
+                "SELECT row, id, document, metadata FROM items WHERE row IN ({})", [int(r) for r in top]
+            )}
+            rows = [int(r) for r in top if int(r) in found]
+            result["ids"].append([found[row][0] for row in rows])
+            if "documents" in result:
+                result["documents"].append([found[row][1] for row in rows])
+            if "metadatas" in result:
+                result["metadatas"].append([json.loads(found[row][2]) if found[row][2] else None for row in rows])
+            if "distances" in result:
+                result["distances"].append([float(1 - row_scores[row]) for row in rows])
+        return result
+
+
+class NumpyVectorClient:
+    """Client with Chroma's get_collection / get_or_create_collection, backed by NumpyCollection directories."""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+
+    def _collection_path(self, name: str) -> Path:
+        return self.path / f"{name}.vectors"
+
+    def get_or_create_collection(self, name: str, embedding_function=None) -> NumpyCollection:
+        return NumpyCollection(self._collection_path(name), name, embedding_function)
+
+    def get_collection(self, name: str, embedding_function=None) -> NumpyCollection:
+        if not self._collection_path(name).is_dir():
+            raise ValueError(f"Collection {name} does not exist.")
+        return NumpyCollection(self._collection_path(name), name, embedding_function)
+
+    def list_collections(self) -> list[str]:
+        return sorted(p.name[:-len(".vectors")] for p in self.path.glob("*.vectors") if p.is_dir())
+
+    def delete_collection(self, name: str) -> None:
+        path = self._collection_path(name)
+        for child in path.iterdir():
+            child.unlink()
+        path.rmdir()
+
+
+def copy_collection(source, destination: NumpyCollection, batch_size: int = 1000) -> int:
+    """Copy every item, with its stored embedding, from a Chroma collection into a NumpyCollection."""
+    copied = 0
+    while True:
+        got = source.get(limit=batch_size, offset=copied, include=["embeddings", "documents", "metadatas"])
+        if not len(got["ids"]):
+            return copied
+        destination.upsert(ids=got["ids"], embeddings=got["embeddings"], documents=got["documents"], metadatas=got["metadatas"])
+        copied += len(got["ids"])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] != "import":
+        print("Usage:")
+        print("  python numpy_index.py import <chroma_dir> <collection> [dest_dir]   # copy a Chroma collection")
+        sys.exit(1)
+
+    from chroma_db import get_chroma_client, get_openai_embedding_function
+
+    chroma_dir, name = sys.argv[2], sys.argv[3]
+    dest_dir = sys.argv[4] if len(sys.argv) > 4 else chroma_dir
+    src = get_chroma_client(persist_dir=chroma_dir).get_collection(name=name)
+    dst = NumpyVectorClient(dest_dir).get_or_create_collection(name, get_openai_embedding_function())
+    print(f"Copied {copy_collection(src, dst)} items from '{name}' into {dst.path}")
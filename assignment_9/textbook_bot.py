@@ -1,7 +1,7 @@
 import os
 import sys
 from openai import OpenAI
-from chroma_db import get_chroma_client
+from chroma_db import get_vector_client
 
 # Default system prompt - can be overridden via command line or environment variable
 DEFAULT_SYSTEM_PROMPT = (
@@ -16,7 +16,7 @@ def main():
     
     # Initialize Chroma client
     persist_dir = os.environ.get("TEXTBOOK_CHROMA_DIR", "./textbook_chroma")
-    chroma_client = get_chroma_client(persist_dir=persist_dir)
+    chroma_client = get_vector_client(persist_dir=persist_dir)
     
     # Get the collection
     try: